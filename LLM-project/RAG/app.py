@@ -1,14 +1,31 @@
-import streamlit as st, time, json, asyncio
+import streamlit as st, json, asyncio
 from google import genai
 from config import *
 from utils.geo_utils import find_nearby_places
 from utils.text_utils import (
     normalize_user_query_spelling,
-    sanitize_output,
-    preserve_swedish_names,
     is_safe_input
 )
-from utils.rag_utils import load_dataset, build_vectorstore
+from utils.rag_utils import (
+    load_dataset,
+    build_vectorstore,
+    detect_nearby_query,
+    geo_similarity_search,
+    materialize_docs,
+    build_filter,
+    INTENT_TYPES
+)
+from utils.record_store import open_record_store
+from utils.query_cache import CachedRetriever
+from utils.retrieval_client import RetrievalClient
+from utils.lexical_index import build_lexical_index, HybridRetriever
+from utils.mmr import MMRRetriever
+from utils.answer_cache import SemanticAnswerCache, doc_keys
+from utils.qa_index import QAIndex
+from utils.stream_processor import StreamProcessor, RenderThrottle
+from utils.context_builder import build_context, relevance_scores, compact_restaurants, compact_history, estimate_tokens
+from utils.gazetteer import load_gazetteer
+from utils.resources import registry, file_version
 from utils.ui_utils import inject_css, render_bubble
 from utils.mcp_utils import fetch_places
 from PIL import Image
@@ -16,22 +33,88 @@ from PIL import Image
 st.set_page_config(page_title="GuideMe Sweden", page_icon="🇸🇪", layout="wide")
 inject_css()
 
-client = genai.Client(api_key=GOOGLE_API_KEY)
-dataset = load_dataset()
-vectordb = build_vectorstore(dataset)
+def load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# Shared, process-wide resources: built once, rebuilt only when their files change
+registry.register("client", lambda: genai.Client(api_key=GOOGLE_API_KEY))
+registry.register("dataset", load_dataset, version=lambda: file_version(DATA_PATH))
+if RETRIEVAL_URLS:
+    # Vector search runs in the retrieval service instances (service/main.py)
+    registry.register(
+        "retriever", lambda: RetrievalClient(RETRIEVAL_URLS, registry.get("dataset")), depends=("dataset",)
+    )
+    registry.register("lexical", lambda: build_lexical_index(registry.get("dataset")), depends=("dataset",))
+else:
+    registry.register(
+        "vectordb", lambda: build_vectorstore(registry.get("dataset")),
+        version=lambda: EMBED_MODEL, depends=("dataset",)
+    )
+    registry.register("retriever", lambda: CachedRetriever(registry.get("vectordb")), depends=("vectordb",))
+    # A sharded vector store brings its own per-region BM25 indexes
+    registry.register(
+        "lexical",
+        lambda: getattr(registry.get("vectordb"), "lexical", None) or build_lexical_index(registry.get("dataset")),
+        depends=("vectordb",)
+    )
+registry.register(
+    "hybrid", lambda: HybridRetriever(registry.get("retriever"), registry.get("lexical"), registry.get("dataset")),
+    depends=("retriever", "lexical")
+)
+# Diversity rerank over the stored document vectors (needs a local index to read them from)
+registry.register(
+    "search",
+    lambda: MMRRetriever(registry.get("hybrid"), registry.get("retriever"))
+    if MMR_FETCH_K > TOP_K and hasattr(registry.get("retriever"), "vectors") else registry.get("hybrid"),
+    depends=("hybrid",)
+)
+registry.register(
+    "gazetteer", lambda: load_gazetteer(registry.get("dataset")),
+    version=lambda: file_version(GAZETTEER_PATH), depends=("dataset",)
+)
+registry.register(
+    "records", lambda: open_record_store(lambda: registry.get("dataset")),
+    version=lambda: file_version(DATA_PATH)
+)
+registry.register("answer_cache", SemanticAnswerCache, depends=("search",))
+registry.register("qa_pairs", lambda: load_json("qa.json"), version=lambda: file_version("qa.json"))
+# Stored questions are embedded with the index's embeddings (none behind the retrieval service)
+registry.register(
+    "qa_index",
+    lambda: QAIndex(
+        registry.get("qa_pairs"),
+        getattr(getattr(registry.get("retriever"), "vectordb", None), "embeddings", None),
+    ),
+    depends=("qa_pairs", "retriever")
+)
+registry.register(
+    "restaurant_ratings", lambda: load_json("ratings_food.json"),
+    version=lambda: file_version("ratings_food.json")
+)
+registry.warm_up()
+
+client = registry.get("client")
+dataset = registry.get("dataset")
+vectordb = None if RETRIEVAL_URLS else registry.get("vectordb")
+retriever = registry.get("retriever")
+search = registry.get("search")
+gazetteer = registry.get("gazetteer")
+records = registry.get("records")
+answer_cache = registry.get("answer_cache")
 
 # Load friendly Q&A dataset
 try:
-    with open("qa.json", "r", encoding="utf-8") as f:
-        qa_pairs = json.load(f)
+    qa_pairs = registry.get("qa_pairs")
+    qa_index = registry.get("qa_index")
 except Exception as e:
     qa_pairs = []
+    qa_index = QAIndex([])
     st.sidebar.error(f"Could not load QA dataset: {e}")
 
 # Load restaurants data from separate json
 try:
-    with open("ratings_food.json", "r", encoding="utf-8") as f:
-        restaurant_ratings = json.load(f)
+    restaurant_ratings = registry.get("restaurant_ratings")
 except Exception as e:
     restaurant_ratings = []
     st.sidebar.error(f"Could not load restaurant dataset: {e}")
@@ -109,6 +192,18 @@ if uploaded_file:
 show_debug = st.sidebar.checkbox("🔧 Show Debug Info", value=False)
 
 if show_debug:
+    st.sidebar.markdown("### Shared Resources")
+    st.sidebar.json(registry.stats())
+    if hasattr(getattr(vectordb, "embeddings", None), "stats"):
+        st.sidebar.markdown("### Embedding Cache")
+        st.sidebar.json(vectordb.embeddings.stats())
+    st.sidebar.markdown("### Retrieval Service" if RETRIEVAL_URLS else "### Query Cache")
+    st.sidebar.json(retriever.stats())
+    if hasattr(vectordb, "route"):
+        st.sidebar.markdown("### Index Shards")
+        st.sidebar.json(vectordb.stats())
+    st.sidebar.markdown("### Answer Cache")
+    st.sidebar.json(answer_cache.stats())
     st.sidebar.markdown("###  Conversation Context")
     st.sidebar.json(st.session_state.conversation_context)
     if st.session_state.pending_mcp_request:
@@ -254,8 +349,10 @@ if user_query and user_query.lower().strip() in [
 ]:
     last_loc = st.session_state.get("last_location")
     if last_loc:
-        nearby = find_nearby_places(dataset, last_loc["lat"], last_loc["lon"], 20)
-        restaurants = [r for r in nearby if r.get("category") == "FoodEstablishment"]
+        restaurants = find_nearby_places(
+            dataset, last_loc["lat"], last_loc["lon"], RADIUS_KM, limit=6,
+            place_type="schema:FoodEstablishment", max_radius_km=NEARBY_MAX_RADIUS_KM
+        )
 
         if restaurants:
             st.markdown(f"### 🍴 Top Restaurants Near {last_loc.get('city', 'Your Location')}")
@@ -305,9 +402,10 @@ if user_query:
 
     # Normalize query
     norm_q = normalize_user_query_spelling(user_query)
-    
+
     # Check if we're waiting for location clarification
-    if st.session_state.conversation_context.get("waiting_for_location"):
+    answering_location = st.session_state.conversation_context.get("waiting_for_location")
+    if answering_location:
         location = extract_location_from_query(user_query)
         
         if location:
@@ -389,8 +487,78 @@ if user_query:
         }
         st.rerun()
 
-    # Regular RAG flow
-    docs = vectordb.similarity_search(norm_q, k=TOP_K)
+    # Curated qa.json answers: confident matches are answered directly,
+    # weaker ones are passed to the model as context further down. Checked only
+    # after the location and live-data flows, which take precedence; a reply
+    # to "which city?" is never matched, and live mode always goes to the model
+    qa_match = None
+    if not has_image and not answering_location:
+        qa_match = qa_index.match(norm_q)
+        if (not qa_match or qa_match["confidence"] != "high") and hasattr(retriever, "embed_query"):
+            qa_match = qa_index.match(norm_q, retriever.embed_query(norm_q)) or qa_match
+        if show_debug and qa_match:
+            st.sidebar.write(f"💬 Q&A match: {qa_match['qa']['question']} ({qa_match['method']}, {qa_match['score']})")
+
+    if qa_match and qa_match["confidence"] == "high" and not st.session_state.use_live_data:
+        answer = qa_match["qa"]["answer"]
+        placeholder = st.empty()
+        placeholder.markdown(f'<div class="bot-bubble">{answer}</div>', unsafe_allow_html=True)
+        if QA_POLISH:
+            # Shown instantly above; the restyled version replaces it as it streams in
+            polish_prompt = f"""
+You are GuideMe Sweden, a warm Swedish travel companion.
+Rephrase the verified answer below so it directly answers the question. Keep every fact, add none,
+respond in **English**, preserve Swedish names, and keep about the same length.
+
+### Question:
+{norm_q}
+
+### Verified answer:
+{answer}
+"""
+            try:
+                polished = StreamProcessor()
+                throttle = RenderThrottle()
+                for chunk in client.models.generate_content_stream(model="gemini-2.5-flash", contents=[polish_prompt]):
+                    if hasattr(chunk, "text") and chunk.text:
+                        polished.feed(chunk.text)
+                        if throttle.due():
+                            placeholder.markdown(f'<div class="bot-bubble">{polished.text.strip()}</div>', unsafe_allow_html=True)
+                if polished.text.strip():
+                    answer = polished.text.strip()
+                    placeholder.markdown(f'<div class="bot-bubble">{answer}</div>', unsafe_allow_html=True)
+            except Exception as e:
+                placeholder.markdown(f'<div class="bot-bubble">{answer}</div>', unsafe_allow_html=True)
+                # The verified answer stands; a toast survives the rerun below
+                st.toast(f"Could not restyle the answer: {e}", icon="⚠️")
+        st.session_state.messages.append({"role": "assistant", "content": answer})
+        st.rerun()
+
+    # Regular RAG flow (restricted to POIs around the location for "nearby" questions)
+    # The known city/region and intent are pushed into the index as filters
+    place = gazetteer.resolve(location)
+    place_type = INTENT_TYPES.get(intent_data.get("intent"))
+    docs = None
+    if detect_nearby_query(norm_q):
+        center = place or st.session_state.last_location
+        if center:
+            docs = geo_similarity_search(
+                search, dataset, norm_q, center["lat"], center["lon"], filter=build_filter(place_type=place_type)
+            )
+    if not docs and (place or place_type):
+        docs = search.similarity_search(norm_q, k=TOP_K, filter=build_filter(place, place_type))
+    if not docs:
+        docs = search.similarity_search(norm_q, k=TOP_K)
+    docs = materialize_docs(docs, records)
+
+    # Remember where the conversation is so follow-ups can search around it
+    if docs and docs[0].metadata.get("latitude") and docs[0].metadata.get("longitude"):
+        meta = docs[0].metadata
+        st.session_state.last_location = {
+            "lat": meta["latitude"],
+            "lon": meta["longitude"],
+            "city": meta.get("city") or meta.get("name"),
+        }
 
     if show_debug:
         st.sidebar.write(f"🔎 Retrieved {len(docs)} documents")
@@ -402,18 +570,17 @@ if user_query:
                 ) or "No documents retrieved."
             )
 
-    # Build context
-    context = "\n\n".join(
-        f"{d.page_content}\nMeta:{json.dumps(d.metadata, ensure_ascii=False)}"
-        for d in docs
-    )
+    # Build context: compact, deduplicated, within the token budget, weak matches dropped
+    scores = None
+    if docs and hasattr(retriever, "vectors"):
+        vectors = retriever.vectors([d.metadata.get("poi_id") for d in docs if d.metadata.get("poi_id")])
+        scores = relevance_scores(retriever.embed_query(norm_q), docs, vectors)
+    context, context_docs = build_context(docs, scores=scores)
 
-    # Add friendly Q&A context if any matching question exists
-    if qa_pairs:
-        for qa in qa_pairs:
-            if qa["question"].lower() in norm_q.lower():
-                context += f"\n\nAdditional Q&A:\nQ: {qa['question']}\nA: {qa['answer']}"
-                break
+    # Add friendly Q&A context if a related question exists
+    if qa_match:
+        qa = qa_match["qa"]
+        context += f"\n\nAdditional Q&A:\nQ: {qa['question']}\nA: {qa['answer']}"
 
     # Detect query types
     q_lower = norm_q.lower()
@@ -447,13 +614,7 @@ if user_query:
         top_rated = sorted(matched, key=lambda x: x.get("rating") or 0, reverse=True)[:6]
 
         if top_rated:
-            restaurant_context = "\n\n".join([
-                f"{r['name']} — Rated {r.get('rating','?')}/5 "
-                f"({r.get('userRatingCount','?')} reviews). "
-                f"Located at {r.get('formattedAddress','N/A')}. "
-                f"Google Maps: {r.get('googleMapsUri','')}"
-                for r in top_rated
-            ])
+            restaurant_context = compact_restaurants(top_rated)
 
     # Build prompt
     if is_summary_request:
@@ -504,36 +665,53 @@ You have access to:
 {restaurant_context if is_food_query else "No cached restaurant data relevant."}
 
 ### Recent Conversation:
-{[m['content'] for m in st.session_state.messages[-3:]]}
+{compact_history(st.session_state.messages[-4:-1]) or "None yet."}
 
 ### Question:
 {norm_q}
 """
 
+    if show_debug:
+        st.sidebar.write(f"🧮 Prompt ≈ {estimate_tokens(hybrid_prompt)} tokens, {len(context_docs)}/{len(docs)} docs in context")
+
+    # Near-duplicate questions over the same documents reuse a previous answer
+    # (never for images or live data, whose answers depend on more than the text)
+    query_vec = None
+    cached_answer = None
+    answer_variant = ("summary" if is_summary_request else "chat", place_name if is_food_query else None)
+    doc_ids = doc_keys(context_docs)
+    if not has_image and not st.session_state.use_live_data and hasattr(retriever, "embed_query"):
+        query_vec = retriever.embed_query(norm_q)
+        cached_answer = answer_cache.get(query_vec, doc_ids, answer_variant)
+
     # Gemini multimodal call
     contents = [hybrid_prompt]
     if has_image:
         image = Image.open(image_to_send)
         contents.append(image)
 
-    # Streaming response
+    # Streaming response: each chunk is post-processed incrementally, the bubble
+    # re-rendered at most STREAM_RENDER_FPS times per second
     placeholder = st.empty()
-    streamed = ""
+    stream = StreamProcessor()
     try:
-        for chunk in client.models.generate_content_stream(
-            model="gemini-2.5-flash",
-            contents=contents
-        ):
-            if hasattr(chunk, "text") and chunk.text:
-                streamed += chunk.text
-                clean = sanitize_output(streamed)
-                placeholder.markdown(
-                    f'<div class="bot-bubble">{preserve_swedish_names(clean.strip())}</div>',
-                    unsafe_allow_html=True,
-                )
-                time.sleep(0.03)
-
-        final = preserve_swedish_names(streamed.strip())
+        if cached_answer is not None:
+            stream.feed(cached_answer)
+        else:
+            throttle = RenderThrottle()
+            for chunk in client.models.generate_content_stream(
+                model="gemini-2.5-flash",
+                contents=contents
+            ):
+                if hasattr(chunk, "text") and chunk.text:
+                    stream.feed(chunk.text)
+                    if throttle.due():
+                        placeholder.markdown(f'<div class="bot-bubble">{stream.text.strip()}</div>', unsafe_allow_html=True)
+            if query_vec is not None and stream.raw.strip() and not stream.blocked:
+                answer_cache.put(query_vec, doc_ids, stream.raw, answer_variant)
+
+        final = stream.text.strip()
+        placeholder.markdown(f'<div class="bot-bubble">{final}</div>', unsafe_allow_html=True)
         st.session_state.messages.append({"role": "assistant", "content": final})
 
         # Display cached restaurant cards if available
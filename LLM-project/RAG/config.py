@@ -7,9 +7,56 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
 PERSIST_DIR = "./chroma_db"
 DATA_PATH = "../final_dataset.json"
-EMBED_MODEL = "models/text-embedding-004"
+GAZETTEER_PATH = "../gazetteer.json"
+RECORD_STORE_DIR = "./record_store"
+VECTOR_BACKEND = "chroma"  # "chroma", "ivf" (in-process ANN index) or "sharded" (per region)
+ANN_INDEX_PATH = "./ann_index.npz"
+IVF_NLIST = None  # None: ~sqrt(n) lists
+IVF_NPROBE = 8
+ANN_QUANTIZATION = None  # None or "int8" (coarse codes + exact rerank)
+ANN_PCA_DIM = None  # e.g. 256 to PCA-reduce vectors before quantizing
+ANN_RERANK = 64
+SHARD_DIR = "./shards"  # VECTOR_BACKEND = "sharded": one IVF index per region
+SHARD_MAX_RESIDENT = 8
+SHARD_FANOUT_WORKERS = 8
+
+# Retrieval service (service/main.py); empty means search in-process
+RETRIEVAL_URLS = [u for u in os.getenv("RETRIEVAL_URLS", "").split(",") if u]
+RETRIEVAL_TIMEOUT_S = 10
+RETRIEVAL_MAX_CONNECTIONS = 20
+EMBED_MODEL = "models/text-embedding-004"  # or "local:hash-768" (offline hashed n-gram TF-IDF)
+LOCAL_EMBED_IDF_PATH = "./local_idf.npy"
+EMBED_BATCH_SIZE = 100
+EMBED_MAX_IN_FLIGHT = 4
+EMBED_RPS = 5
+EMBED_MAX_RETRIES = 5
+EMBED_CACHE_DIR = "./embed_cache"
+EMBED_CACHE_MAX_ENTRIES = 200_000
 TOP_K = 6
 RADIUS_KM = 20
+NEARBY_MAX_RADIUS_KM = 2 * RADIUS_KM  # expanding nearby searches (restaurant follow-up) never go farther
+GEO_MAX_CANDIDATES = 500
+HYBRID_DENSE_K = 4
+HYBRID_LEXICAL_K = 10
+RRF_K = 60
+QUERY_CACHE_MAX_ENTRIES = 1024
+QUERY_CACHE_TTL_S = 3600
+MMR_FETCH_K = 20  # candidates reranked for diversity; TOP_K or less disables MMR
+MMR_LAMBDA = 0.5  # 1.0: pure relevance, 0.0: pure diversity
+ANSWER_CACHE_THRESHOLD = 0.92  # min query cosine similarity to reuse an answer over the same docs
+ANSWER_CACHE_MAX_ENTRIES = 512
+ANSWER_CACHE_TTL_S = 6 * 3600
+QA_TRIGRAM_HIGH = 0.8  # qa.json matches at or above the HIGH thresholds are answered directly
+QA_TRIGRAM_MEDIUM = 0.5  # ... and at or above MEDIUM added to the prompt as context
+QA_EMBED_HIGH = 0.92
+QA_EMBED_MEDIUM = 0.8
+QA_POLISH = False  # restyle direct qa.json answers with Gemini after showing them
+CONTEXT_TOKEN_BUDGET = 1200  # estimated tokens of retrieved documents per prompt
+CONTEXT_SCORE_DROP = 0.1  # drop docs this far (cosine) below the best match
+CONTEXT_MIN_DOCS = 2
+RESTAURANT_TOKEN_BUDGET = 250
+HISTORY_TOKEN_BUDGET = 200
+STREAM_RENDER_FPS = 15  # max re-renders per second of a streaming answer
 
 # COLORS
 NAVY = "#001B44"
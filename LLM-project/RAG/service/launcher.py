@@ -0,0 +1,56 @@
+"""
+Start N retrieval service instances on one machine.
+
+    python -m service.launcher --instances 3 --base-port 8100
+
+Shards are (re)built once here before the instances start, so they never
+race on SHARD_DIR. Export the printed RETRIEVAL_URLS before starting the
+Streamlit app to route its searches to the instances.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from utils.rag_utils import load_dataset, build_vectorstore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local sharded retrieval deployment.")
+    parser.add_argument("--instances", type=int, default=2)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=8100)
+    args = parser.parse_args()
+
+    build_vectorstore(load_dataset(), backend="sharded")
+    urls = [f"http://{args.host}:{args.base_port + i}" for i in range(args.instances)]
+    procs = []
+    for i, url in enumerate(urls):
+        env = dict(os.environ, RETRIEVAL_NODE=url, RETRIEVAL_URLS=",".join(urls))
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "service.main:app", "--host", args.host, "--port", str(args.base_port + i)],
+            env=env,
+        ))
+
+    print(f"\nStarted {len(urls)} retrieval instances")
+    print(f"export RETRIEVAL_URLS={','.join(urls)}")
+    print("Press CTRL+C to stop\n")
+
+    def shutdown(*_):
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    while all(p.poll() is None for p in procs):
+        time.sleep(1)
+    print("An instance exited; stopping the rest")
+    shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Retrieval service: the region-sharded vector index behind a small HTTP API.
+
+Run from the RAG directory, e.g.
+    RETRIEVAL_NODE=http://127.0.0.1:8100 RETRIEVAL_URLS=http://127.0.0.1:8100 \
+        python -m uvicorn service.main:app --port 8100
+or start several instances with ``python -m service.launcher``. Each
+instance serves only the shards the consistent hash ring over
+RETRIEVAL_URLS assigns to RETRIEVAL_NODE (all of them when unset).
+"""
+import os
+from fastapi import FastAPI, HTTPException
+from config import RETRIEVAL_URLS
+from utils.rag_utils import load_dataset, get_embeddings
+from utils.query_cache import CachedRetriever
+from utils.record_store import open_record_store
+from utils.retrieval_client import HashRing, node_url
+from utils.shards import ShardedStore
+from .schemas import (
+    SearchRequest, SearchResponse, BatchSearchRequest, BatchSearchResponse,
+    RecordsRequest, RecordsResponse, HealthResponse,
+)
+
+NODE = node_url(os.getenv("RETRIEVAL_NODE", ""))
+ring = HashRing([node_url(u) for u in RETRIEVAL_URLS]) if NODE and RETRIEVAL_URLS else None
+
+dataset = load_dataset()
+store = ShardedStore(dataset, get_embeddings(), owns=(lambda name: ring.node_for(name) == NODE) if ring else None)
+queries = CachedRetriever(store)
+records = open_record_store(lambda: dataset)
+
+app = FastAPI(title="GuideMe Retrieval Service", version="1.0")
+
+
+def _search(req: SearchRequest) -> SearchResponse:
+    hits = store.search_by_vector(queries.embed_query(req.query), req.k, req.filter)
+    return SearchResponse(hits=[
+        {"id": d.metadata.get("poi_id"), "document": d.page_content, "metadata": d.metadata, "score": s}
+        for d, s in hits
+    ])
+
+
+@app.post("/search", response_model=SearchResponse)
+def search(req: SearchRequest):
+    try:
+        return _search(req)
+    except Exception as e:
+        # Requests are validated by the schema (422), so whatever fails here is on the server
+        print(f"Search failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/search_batch", response_model=BatchSearchResponse)
+def search_batch(req: BatchSearchRequest):
+    try:
+        return BatchSearchResponse(results=[_search(r) for r in req.requests])
+    except Exception as e:
+        # Requests are validated by the schema (422), so whatever fails here is on the server
+        print(f"Batch search failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/records", response_model=RecordsResponse)
+def get_records(req: RecordsRequest):
+    return RecordsResponse(records={pid: records.get(pid) for pid in req.ids})
+
+
+@app.get("/health", response_model=HealthResponse)
+def health():
+    stats = store.stats()
+    return HealthResponse(status="ok", node=NODE or "local", shards=sorted(store.manifest), resident=stats["resident"])
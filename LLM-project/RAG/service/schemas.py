@@ -0,0 +1,65 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, field_validator
+
+FILTER_OPS = {"$eq", "$ne", "$in", "$nin"}
+
+def check_filter(flt):
+    """Raise ValueError unless flt is a where-filter the indexes understand (equality, $eq/$ne/$in/$nin, $and/$or)."""
+    if not isinstance(flt, dict):
+        raise ValueError("filter must be an object")
+    for key, cond in flt.items():
+        if key in ("$and", "$or"):
+            if not isinstance(cond, list):
+                raise ValueError(f"{key} takes a list of filters")
+            for f in cond:
+                check_filter(f)
+        elif key.startswith("$"):
+            raise ValueError(f"unsupported filter operator {key}")
+        elif isinstance(cond, dict):
+            for op, arg in cond.items():
+                if op not in FILTER_OPS:
+                    raise ValueError(f"unsupported filter operator {op}")
+                if (op in ("$in", "$nin")) != isinstance(arg, list) or isinstance(arg, dict):
+                    raise ValueError(f"{key}: bad argument for {op}")
+        elif isinstance(cond, list):
+            raise ValueError(f"{key}: use $in to match a list of values")
+
+class SearchRequest(BaseModel):
+    query: str = Field(..., description="Natural-language query.")
+    k: int = Field(6, ge=1, le=100, description="Number of hits to return.")
+    filter: Optional[dict] = Field(None, description="Chroma-style metadata filter (city, region, type, poi_id).")
+
+    @field_validator("filter")
+    @classmethod
+    def _valid_filter(cls, v):
+        # Malformed filters are rejected here with a 422, before any index work
+        if v is not None:
+            check_filter(v)
+        return v
+
+class Hit(BaseModel):
+    id: str
+    document: str
+    metadata: dict
+    score: float
+
+class SearchResponse(BaseModel):
+    hits: List[Hit]
+
+class BatchSearchRequest(BaseModel):
+    requests: List[SearchRequest] = Field(..., max_length=256)
+
+class BatchSearchResponse(BaseModel):
+    results: List[SearchResponse]
+
+class RecordsRequest(BaseModel):
+    ids: List[str] = Field(..., max_length=1000)
+
+class RecordsResponse(BaseModel):
+    records: Dict[str, Optional[dict]]
+
+class HealthResponse(BaseModel):
+    status: str
+    node: str
+    shards: List[str]
+    resident: List[str]
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from utils.ann_index import IVFIndex, benchmark
+
+
+def clustered(n=4000, dim=48, centers=40, seed=0):
+    rng = np.random.default_rng(seed)
+    c = rng.standard_normal((centers, dim))
+    x = c[rng.integers(0, centers, n)] + 0.3 * rng.standard_normal((n, dim))
+    return x.astype(np.float32)
+
+
+def build(x, **kwargs):
+    ids = [f"p{i}" for i in range(len(x))]
+    metas = [{"poi_id": pid, "city": "stockholm" if i % 2 else "uppsala"} for i, pid in enumerate(ids)]
+    return IVFIndex.build(ids, x, [f"doc {i}" for i in range(len(x))], metas, **kwargs)
+
+
+def recall(index, queries, k=10, **kwargs):
+    hits = [len(set(index.search(q, k, **kwargs)[0].tolist()) & set(index.exact_search(q, k)[0].tolist())) / k
+            for q in queries]
+    return float(np.mean(hits))
+
+
+@pytest.fixture(scope="module")
+def data():
+    x = clustered()
+    return x, x[::97] + 0.05
+
+
+def test_full_probe_equals_exact(data):
+    x, queries = data
+    index = build(x)
+    assert recall(index, queries, nprobe=index.nlist) == 1.0
+
+
+def test_default_probe_recall(data):
+    x, queries = data
+    assert recall(build(x), queries) >= 0.9
+
+
+def test_int8_and_pca_recall_with_rerank(data):
+    x, queries = data
+    assert recall(build(x, quantization="int8"), queries) >= 0.9
+    assert recall(build(x, quantization="int8", pca_dim=24), queries, rerank=64) >= 0.85
+
+
+def test_filter_restricts_results(data):
+    x, queries = data
+    index = build(x)
+    rows, _ = index.search(queries[0], 20, filter={"city": "uppsala"}, nprobe=index.nlist)
+    assert len(rows) == 20 and all(index.metadata(r)["city"] == "uppsala" for r in rows.tolist())
+
+
+def test_saved_quantized_index_memory_maps_vectors(data, tmp_path):
+    x, queries = data
+    index = build(x, quantization="int8")
+    path = str(tmp_path / "ann.npz")
+    index.save(path)
+    assert isinstance(index.vectors, np.memmap)
+    assert index.memory_usage() < x.nbytes
+    loaded = IVFIndex.load(path)
+    assert loaded.memory_usage() == index.memory_usage()
+    assert [r["recall"] for r in benchmark(loaded, queries[:5], nprobes=(loaded.nlist,))] == [1.0, 1.0]
@@ -0,0 +1,42 @@
+import numpy as np
+from langchain.schema import Document
+from utils.answer_cache import SemanticAnswerCache, doc_keys
+
+Q = np.array([1.0, 0.0, 0.0])
+NEAR = np.array([0.99, 0.1, 0.0])
+FAR = np.array([0.0, 1.0, 0.0])
+
+
+def test_documents_without_poi_id_get_distinct_keys():
+    a = [Document(page_content="name: Skansen", metadata={})]
+    b = [Document(page_content="name: Liseberg", metadata={"poi_id": None})]
+    c = [Document(page_content="name: Vasa", metadata={"poi_id": "vasa"})]
+    assert doc_keys(a) != doc_keys(b)
+    assert doc_keys(a) == doc_keys([Document(page_content="name: Skansen", metadata={})])
+    assert doc_keys(c) == ["vasa"]
+
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put(Q, doc_keys(a), "about Skansen")
+    assert cache.get(Q, doc_keys(b)) is None
+    assert cache.get(Q, doc_keys(a)) == "about Skansen"
+
+
+def test_similar_question_over_same_docs_hits():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put(Q, ["x", "y"], "answer")
+    assert cache.get(NEAR, ["y", "x"]) == "answer"
+    assert cache.get(FAR, ["x", "y"]) is None
+    assert cache.get(NEAR, ["x"]) is None
+    assert cache.get(NEAR, ["x", "y"], variant="summary") is None
+
+
+def test_lru_eviction_and_ttl():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=2, ttl=3600)
+    for i in range(3):
+        cache.put(Q, [str(i)], f"answer {i}")
+    assert cache.get(Q, ["0"]) is None and cache.get(Q, ["2"]) == "answer 2"
+    assert cache.stats()["evictions"] == 1
+
+    expired = SemanticAnswerCache(threshold=0.9, ttl=-1)
+    expired.put(Q, ["x"], "stale")
+    assert expired.get(Q, ["x"]) is None and len(expired) == 0
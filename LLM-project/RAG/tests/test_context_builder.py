@@ -0,0 +1,89 @@
+import numpy as np
+from langchain.schema import Document
+from utils.context_builder import (
+    estimate_tokens, truncate_to_tokens, compact_doc, adaptive_cut, build_context, relevance_scores,
+    compact_restaurants, compact_history,
+)
+
+SHARED = "It is one of the most visited sights in Sweden."
+
+
+def doc(i, sentences=4):
+    body = " ".join(f"Attraction {i} has feature number {j} worth seeing." for j in range(sentences))
+    content = (f"name: Place {i}\ncity: Stockholm\nregion: http://data.visitsweden.com/region/stockholm\n"
+               f"street: Gatan {i}\ndescription: {body} {SHARED}\ncheckin_time: 15:00")
+    meta = {"poi_id": f"p{i}", "name": f"Place {i}", "url": f"https://visit.se/{i}",
+            "image": f"https://img.se/{i}.jpg", "map_link": "https://www.google.com/maps?q=59.3,18.1"}
+    return Document(page_content=content, metadata=meta)
+
+
+DOCS = [doc(i) for i in range(12)]
+
+
+def test_context_stays_within_budget():
+    for budget in (60, 150, 400, 1200):
+        text, used = build_context(DOCS, budget)
+        assert estimate_tokens(text) <= budget + 3 * len(used)  # "[n] " labels are not budgeted
+        assert used == DOCS[:len(used)]
+
+
+def test_small_budget_uses_fewer_documents():
+    _, small = build_context(DOCS, 100)
+    _, large = build_context(DOCS, 1000)
+    assert 0 < len(small) < len(large)
+
+
+def test_presentation_fields_are_dropped_and_region_shortened():
+    text = compact_doc(DOCS[0])
+    header = text.splitlines()[0]
+    assert header == "Place 0 — Stockholm, stockholm — Gatan 0"
+    assert "(checkin-time: 15:00; web: https://visit.se/0)" in text
+    assert "img.se" not in text and "maps" not in text
+    assert "name:" not in text and "description:" not in text
+
+
+def test_sentences_repeated_across_documents_are_sent_once():
+    text, used = build_context(DOCS[:3], 1000)
+    assert len(used) == 3
+    assert text.count(SHARED) == 1
+
+
+def test_truncate_keeps_whole_sentences_then_words():
+    text = "One two three. Four five six. Seven eight nine."
+    assert truncate_to_tokens(text, 100) == text
+    assert truncate_to_tokens(text, 9) == "One two three. Four five six."
+    assert truncate_to_tokens(text, 8) == "One two three."
+    assert truncate_to_tokens("alpha beta gamma delta epsilon", 4).endswith("…")
+    assert truncate_to_tokens("alpha beta", 0) == ""
+
+
+def test_adaptive_cut_drops_far_weaker_docs():
+    scores = [0.9, 0.85, 0.5, 0.88, None, 0.1]
+    kept = adaptive_cut(DOCS[:6], scores, drop=0.1, min_docs=2)
+    assert kept == [DOCS[0], DOCS[1], DOCS[3], DOCS[4]]
+    assert adaptive_cut(DOCS[:3], [None] * 3) == DOCS[:3]
+    # min_docs keeps the head even when it scores low
+    assert adaptive_cut(DOCS[:3], [0.1, 0.05, 0.9], drop=0.1, min_docs=2) == DOCS[:3]
+
+
+def test_relevance_scores_are_cosines():
+    vectors = {"p0": np.array([1.0, 0.0]), "p1": np.array([1.0, 1.0])}
+    scores = relevance_scores([2.0, 0.0], DOCS[:3], vectors)
+    assert scores[0] == 1.0
+    assert abs(scores[1] - 2 ** -0.5) < 1e-6
+    assert scores[2] is None
+
+
+def test_restaurants_and_history_respect_budgets():
+    rows = [{"name": f"Krog {i}", "rating": 4.5, "userRatingCount": 100 + i, "formattedAddress": f"Gatan {i}"}
+            for i in range(50)]
+    lines = compact_restaurants(rows, budget=60).splitlines()
+    assert 0 < len(lines) < 50 and lines[0].startswith("Krog 0")
+    assert estimate_tokens("\n".join(lines)) <= 60
+
+    messages = [{"role": "user" if i % 2 == 0 else "assistant",
+                 "content": f"<div>Message {i} " + "word " * 40 + "</div>"} for i in range(10)]
+    history = compact_history(messages, budget=80)
+    assert estimate_tokens(history) <= 80
+    assert "<div>" not in history
+    assert history.splitlines()[-1].startswith("Assistant: Message 9")
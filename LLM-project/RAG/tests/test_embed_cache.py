@@ -0,0 +1,76 @@
+import numpy as np
+from utils.embed_cache import EmbeddingCache
+
+
+def vec(x, dim=8):
+    return np.full(dim, x, dtype=np.float32)
+
+
+def test_roundtrip_and_dedup(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many("m|document", ["a", "b", "a"], [vec(1), vec(2), vec(1)])
+    got = cache.get_many("m|document", ["a", "b", "c"])
+    assert got[0][0] == 1 and got[1][0] == 2 and got[2] is None
+    assert len(cache) == 2
+    assert cache.get_many("m|query", ["a"]) == [None]
+
+
+def test_eviction_frees_slots_for_reuse(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=3)
+    for i, t in enumerate("abc"):
+        cache.put_many("ns", [t], [vec(i)])
+    cache.get_many("ns", ["a"])  # "b" is now least recently used
+    cache.put_many("ns", ["d"], [vec(3)])
+    assert cache.evictions == 1
+    assert cache.get_many("ns", ["b"]) == [None]
+    assert [v[0] for v in cache.get_many("ns", ["a", "c", "d"])] == [0, 2, 3]
+    # b's slot is freed by the eviction and handed to the next new entry
+    cache.put_many("ns", ["e"], [vec(4)])
+    slot_of = dict(cache._db.execute("SELECT key, slot FROM entries").fetchall())
+    assert cache.get_many("ns", ["e"])[0][0] == 4
+    assert 1 in slot_of.values() and max(slot_of.values()) == 3
+
+
+def test_reads_slots_beyond_stale_mapping(tmp_path):
+    reader = EmbeddingCache(str(tmp_path))
+    writer = EmbeddingCache(str(tmp_path))
+    reader.put_many("ns", ["first"], [vec(-1)])  # maps a 1024-row slab
+    texts = [f"t{i}" for i in range(1500)]
+    writer.put_many("ns", texts, [vec(i) for i in range(1500)])  # grows the file
+    got = reader.get_many("ns", texts[-3:])
+    assert [v[0] for v in got] == [1497, 1498, 1499]
+
+
+def test_interleaved_instances_never_share_slots(tmp_path):
+    a = EmbeddingCache(str(tmp_path))
+    b = EmbeddingCache(str(tmp_path))
+    for i in range(200):
+        a.put_many("ns", [f"a{i}"], [vec(i)])
+        b.put_many("ns", [f"b{i}"], [vec(1000 + i)])
+        assert a.get_many("ns", [f"b{i}"])[0][0] == 1000 + i
+        assert b.get_many("ns", [f"a{i}"])[0][0] == i
+    slots = [s for (s,) in a._db.execute("SELECT slot FROM entries")]
+    assert len(slots) == len(set(slots)) == 400
+    assert all(a.get_many("ns", [f"a{i}"])[0][0] == i for i in range(200))
+
+
+def _writer(directory, worker, n):
+    cache = EmbeddingCache(directory, max_entries=10 ** 6)
+    for i in range(n):
+        cache.put_many("ns", [f"w{worker}-{i}"], [vec(worker * 1000 + i)])
+        assert cache.get_many("ns", [f"w{worker}-{i}"])[0][0] == worker * 1000 + i
+
+
+def test_concurrent_processes_keep_vectors_apart(tmp_path):
+    import multiprocessing
+    procs = [multiprocessing.Process(target=_writer, args=(str(tmp_path), w, 200)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert [p.exitcode for p in procs] == [0] * 4
+    cache = EmbeddingCache(str(tmp_path))
+    assert len(cache) == 800
+    for w in range(4):
+        got = cache.get_many("ns", [f"w{w}-{i}" for i in range(200)])
+        assert [v[0] for v in got] == [w * 1000 + i for i in range(200)]
@@ -0,0 +1,124 @@
+import threading
+import time
+import numpy as np
+import pytest
+from utils.embed_pipeline import EmbeddingPipeline, EmbeddingCheckpoint, TokenBucket
+
+DIM = 4
+TEXTS = [f"document number {i}" for i in range(23)]
+KEYS = [f"{i:040x}" for i in range(len(TEXTS))]
+
+
+def vector(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0, 0.0]
+
+
+class FakeBackend:
+    """Records every successful batch; fails calls numbered in `fail_calls` and any batch holding `fail_on`."""
+
+    def __init__(self, fail_calls=(), fail_on=None):
+        self.batches = []
+        self.calls = 0
+        self.fail_calls = set(fail_calls)
+        self.fail_on = fail_on
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if call in self.fail_calls or (self.fail_on and self.fail_on in texts):
+            raise RuntimeError("429 Resource exhausted")
+        with self._lock:
+            self.batches.append(list(texts))
+        return [vector(t) for t in texts]
+
+
+def pipeline(backend, **kwargs):
+    kwargs = {"batch_size": 5, "max_in_flight": 3, "requests_per_sec": 1000, "base_delay": 0.0, **kwargs}
+    return EmbeddingPipeline(backend, **kwargs)
+
+
+def test_batches_cover_every_text_once():
+    backend = FakeBackend()
+    out = pipeline(backend).embed(KEYS, TEXTS)
+    assert list(out) == KEYS
+    assert all(np.allclose(out[k], vector(t)) for k, t in zip(KEYS, TEXTS))
+    assert sorted(len(b) for b in backend.batches) == [3, 5, 5, 5, 5]
+    assert sorted(t for b in backend.batches for t in b) == sorted(TEXTS)
+
+
+def test_failed_batches_are_retried():
+    backend = FakeBackend(fail_calls={1, 2, 4})
+    out = pipeline(backend, max_retries=3).embed(KEYS, TEXTS)
+    assert len(out) == len(TEXTS)
+    assert backend.calls == 5 + 3
+
+
+def test_gives_up_after_max_retries():
+    backend = FakeBackend(fail_on=TEXTS[7])
+    with pytest.raises(RuntimeError):
+        pipeline(backend, max_retries=2, max_in_flight=1).embed(KEYS, TEXTS)
+    # The other four batches succeed; the failing one is tried 1 + 2 times
+    assert len(backend.batches) == 4 and backend.calls == 4 + 3
+
+
+def test_checkpoint_resumes_without_reembedding(tmp_path):
+    path = str(tmp_path / "ckpt.bin")
+    failing = FakeBackend(fail_on=TEXTS[12])
+    with pytest.raises(RuntimeError):
+        pipeline(failing, max_retries=0, max_in_flight=1, checkpoint_path=path).embed(KEYS, TEXTS)
+    saved = EmbeddingCheckpoint(path).load()
+    assert set(saved) == {k for b in failing.batches for k, t in zip(KEYS, TEXTS) if t in b}
+
+    backend = FakeBackend()
+    out = pipeline(backend, checkpoint_path=path).embed(KEYS, TEXTS)
+    assert all(np.allclose(out[k], vector(t)) for k, t in zip(KEYS, TEXTS))
+    redone = {t for b in backend.batches for t in b}
+    assert redone == {t for k, t in zip(KEYS, TEXTS) if k not in saved}
+
+
+def test_torn_final_record_is_ignored(tmp_path):
+    path = str(tmp_path / "ckpt.bin")
+    ckpt = EmbeddingCheckpoint(path)
+    ckpt.append(KEYS[:3], [vector(t) for t in TEXTS[:3]])
+    with open(path, "ab") as f:
+        f.write(b"\x01" * 17)
+    assert list(EmbeddingCheckpoint(path).load()) == KEYS[:3]
+
+
+def test_checkpoint_restarts_when_dimension_changes(tmp_path):
+    path = str(tmp_path / "ckpt.bin")
+    ckpt = EmbeddingCheckpoint(path)
+    ckpt.append(KEYS[:2], np.ones((2, DIM)))
+    ckpt.append(KEYS[2:3], np.ones((1, DIM + 2)))
+    loaded = EmbeddingCheckpoint(path).load()
+    assert list(loaded) == KEYS[2:3] and loaded[KEYS[2]].shape == (DIM + 2,)
+
+
+def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    # The first token is already in the bucket; ten more take 1/50 s each
+    assert time.monotonic() - start >= 0.19
+
+
+def test_local_backend_takes_one_vectorized_call():
+    class Local:
+        local = True
+
+        def __init__(self):
+            self.calls = 0
+
+        def embed_array(self, texts):
+            self.calls += 1
+            return np.array([vector(t) for t in texts], dtype=np.float32)
+
+        def embed_documents(self, texts):
+            raise AssertionError("local backends are embedded through embed_array")
+
+    backend = Local()
+    out = pipeline(backend).embed(KEYS, TEXTS)
+    assert backend.calls == 1 and len(out) == len(TEXTS)
@@ -0,0 +1,33 @@
+import json
+from utils.gazetteer import Gazetteer, load_gazetteer
+
+REGION = "http://data.visitsweden.com/region/uppsala-lan"
+RECORDS = [
+    {"city": "Uppsala", "region": REGION, "latitude": 59.86, "longitude": 17.64},
+    {"city": "Uppsala", "region": REGION, "latitude": 59.85, "longitude": 17.63},
+    {"city": "Enköping", "region": REGION, "latitude": 59.64, "longitude": 17.08},
+    {"city": "Nowhere", "latitude": None, "longitude": None},
+]
+
+
+def test_build_resolves_cities_and_regions():
+    gaz = Gazetteer.from_records(RECORDS)
+    assert gaz.resolve("enkoping")["kind"] == "city"
+    assert gaz.resolve("Uppsala, Sweden")["region"] == "uppsala-lan"
+    assert gaz.resolve("uppsala-lan")["kind"] == "region"
+    assert gaz.resolve("Nowhere") is None
+
+
+def test_missing_file_is_built_and_saved_for_other_readers(tmp_path):
+    path = str(tmp_path / "gazetteer.json")
+    gaz = load_gazetteer(RECORDS, path)
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["places"] == gaz.places
+    assert len(load_gazetteer(None, path)) == len(gaz)
+
+
+def test_empty_build_is_not_saved(tmp_path):
+    path = tmp_path / "gazetteer.json"
+    assert len(load_gazetteer([], str(path))) == 0
+    assert not path.exists()
@@ -0,0 +1,129 @@
+import math
+from collections import Counter
+import pytest
+from utils.lexical_index import BM25Index, HybridRetriever, tokenize, lexical_text, rrf_fuse
+from utils.poi_store import POIStore
+from utils.rag_utils import make_doc_from_record
+
+IDS = ["vasa", "skansen", "liseberg", "kyrka", "cafe"]
+TEXTS = [
+    "Vasamuseet\nThe Vasa museum shows a 17th century warship salvaged from Stockholm harbour.",
+    "Skansen\nOpen-air museum and zoo on Djurgården with historic houses from all over Sweden.",
+    "Liseberg\nAmusement park in Göteborg with roller coasters, concerts and a Christmas market.",
+    "Uppsala domkyrka\nThe tallest church in Scandinavia, a Gothic cathedral in Uppsala.",
+    "Café Saturnus\nCafé in Stockholm known for its huge cinnamon buns and fika.",
+]
+
+
+def naive_bm25(query, texts, k1=1.2, b=0.75):
+    docs = [Counter(tokenize(t)) for t in texts]
+    avg = sum(sum(d.values()) for d in docs) / len(docs)
+    scores = []
+    for d in docs:
+        length, s = sum(d.values()), 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in other for other in docs)
+            if not d[term]:
+                continue
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            s += idf * d[term] * (k1 + 1) / (d[term] + k1 * (1 - b + b * length / avg))
+        scores.append(s)
+    return scores
+
+
+@pytest.fixture(scope="module")
+def index():
+    return BM25Index(IDS, TEXTS)
+
+
+def test_scores_match_reference_bm25(index):
+    for query in ("museum in Stockholm", "cinnamon buns", "cathedral Uppsala"):
+        expected = {pid: s for pid, s in zip(IDS, naive_bm25(query, TEXTS)) if s > 0}
+        got = dict(index.search(query, k=len(IDS)))
+        assert got.keys() == expected.keys()
+        for pid in got:
+            assert got[pid] == pytest.approx(expected[pid], rel=1e-5)
+
+
+def test_ranking_on_tiny_corpus(index):
+    assert index.search("Vasa warship", k=1)[0][0] == "vasa"
+    assert index.search("roller coasters in Gothenburg", k=1)[0][0] == "liseberg"
+    assert index.search("fika and buns", k=1)[0][0] == "cafe"
+    top = [pid for pid, _ in index.search("museum", k=5)]
+    assert set(top) == {"vasa", "skansen"}
+
+
+def test_compounds_and_inflections_match(index):
+    # "domkyrka" is split into dom + kyrka; "museet" is the definite form of "museum"
+    assert index.search("kyrka", k=1)[0][0] == "kyrka"
+    assert index.search("museet", k=2)[0][0] in {"vasa", "skansen"}
+
+
+def test_allowed_rows_restricts_hits(index):
+    hits = index.search("museum Stockholm", k=5, allowed_rows=[1, 4])
+    assert {pid for pid, _ in hits} <= {"skansen", "cafe"}
+    assert index.search("warship", k=5, allowed_rows=[2, 3]) == []
+
+
+def test_unknown_terms_and_stop_words_return_nothing(index):
+    assert index.search("xylophone", k=5) == []
+    assert index.search("the and of", k=5) == []
+
+
+def test_lexical_text_drops_labels_and_repeats_name():
+    text = lexical_text("name: Skansen\ncity: Stockholm\ndescription: Open-air museum")
+    assert text.splitlines()[0] == "Skansen"
+    assert "name:" not in text and "city:" not in text
+    assert text.count("Skansen") == 2
+
+
+def test_rrf_fuse_rewards_agreement():
+    fused = rrf_fuse([["a", "b", "c"], ["b", "c", "a"], ["b", "d"]])
+    assert fused[0] == "b"
+    assert set(fused) == {"a", "b", "c", "d"}
+    assert fused[-1] == "d"
+
+
+def test_saved_index_ranks_identically(index, tmp_path):
+    path = str(tmp_path / "bm25.npz")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    for query in ("museum in Stockholm", "roller coasters", "kyrka"):
+        assert loaded.search(query, k=5) == index.search(query, k=5)
+
+
+class FakeDense:
+    """Dense stand-in: the first k dataset rows matching the filter, recording each requested k."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.requested = []
+
+    def similarity_search(self, query, k=6, filter=None):
+        self.requested.append(k)
+        rows = self.dataset.rows_where(filter) if filter else range(len(self.dataset))
+        return [make_doc_from_record(self.dataset[r], self.dataset.ids[r]) for r in list(rows)[:k]]
+
+
+@pytest.fixture(scope="module")
+def poi_store():
+    records = [{"type": "schema:Place", "name": f"Place {i}", "description": f"Sight number {i}.",
+                "region": f"http://data.visitsweden.com/region/{'skane' if i % 2 else 'stockholm'}",
+                "latitude": 59 + i / 100, "longitude": 18.0} for i in range(30)]
+    return POIStore(records)
+
+
+@pytest.mark.parametrize("query, filter", [
+    ("xylophone", None),  # no lexical hits at all
+    ("Place 3", None),  # a few lexical hits
+    ("sight", {"region": "skane"}),
+])
+def test_hybrid_returns_k_documents(poi_store, query, filter):
+    texts = [lexical_text(make_doc_from_record(r, pid).page_content) for r, pid in zip(poi_store, poi_store.ids)]
+    dense = FakeDense(poi_store)
+    hybrid = HybridRetriever(dense, BM25Index(poi_store.ids, texts), poi_store, dense_k=4, lexical_k=2)
+    for k in (6, 10):
+        docs = hybrid.similarity_search(query, k=k, filter=filter)
+        assert len(docs) == k
+        assert len({d.metadata["poi_id"] for d in docs}) == k
+        assert dense.requested[-1] >= k
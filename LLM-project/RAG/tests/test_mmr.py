@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from utils.lexical_index import BM25Index, HybridRetriever, lexical_text
+from utils.mmr import MMRRetriever, mmr_select
+from utils.poi_store import POIStore
+from utils.rag_utils import make_doc_from_record
+
+DIM = 8
+
+
+class FakeDense:
+    """The first k dataset rows matching the filter."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def similarity_search(self, query, k=6, filter=None):
+        rows = self.dataset.rows_where(filter) if filter else range(len(self.dataset))
+        return [make_doc_from_record(self.dataset[r], self.dataset.ids[r]) for r in list(rows)[:k]]
+
+
+class FakeVectors:
+    """Stored vectors: pairs of rows (0/1, 2/3, ...) are near-duplicates."""
+
+    def __init__(self, dataset):
+        rng = np.random.default_rng(0)
+        base = rng.normal(size=(len(dataset) // 2 + 1, DIM))
+        self.by_id = {pid: base[i // 2] + rng.normal(scale=0.01, size=DIM) for i, pid in enumerate(dataset.ids)}
+
+    def embed_query(self, query):
+        return np.ones(DIM).tolist()
+
+    def vectors(self, ids):
+        return {i: self.by_id[i] for i in ids if i in self.by_id}
+
+
+class Spy:
+    """Wraps a retriever and records how many candidates each call returned."""
+
+    def __init__(self, retriever):
+        self.retriever = retriever
+        self.returned = []
+
+    def similarity_search(self, query, k=6, filter=None):
+        docs = self.retriever.similarity_search(query, k=k, filter=filter)
+        self.returned.append(len(docs))
+        return docs
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    return POIStore([{"type": "schema:Place", "name": f"Museum {i}", "description": f"Exhibition hall {i}.",
+                      "region": "http://data.visitsweden.com/region/stockholm",
+                      "latitude": 59 + i / 100, "longitude": 18.0} for i in range(40)])
+
+
+def test_mmr_reranks_the_full_fetch_pool(dataset):
+    texts = [lexical_text(make_doc_from_record(r, pid).page_content) for r, pid in zip(dataset, dataset.ids)]
+    hybrid = Spy(HybridRetriever(FakeDense(dataset), BM25Index(dataset.ids, texts), dataset, dense_k=4, lexical_k=10))
+    mmr = MMRRetriever(hybrid, FakeVectors(dataset), fetch_k=20, lambda_mult=0.5)
+    for query, filter in (("museum", None), ("xylophone", None), ("hall", {"region": "stockholm"})):
+        docs = mmr.similarity_search(query, k=6, filter=filter)
+        assert hybrid.returned[-1] == 20
+        assert len(docs) == 6
+
+
+def test_mmr_skips_near_duplicates():
+    # Five distinct, equally relevant places, each stored twice
+    rng = np.random.default_rng(1)
+    base = np.eye(DIM)[:5]
+    vectors = np.repeat(base, 2, axis=0) + rng.normal(scale=0.001, size=(10, DIM))
+    picks = mmr_select(base.sum(axis=0), vectors, k=5, lambda_mult=0.5)
+    assert len(picks) == 5
+    assert len({i // 2 for i in picks}) == 5
+
+
+def test_mmr_returns_everything_when_pool_is_small():
+    assert mmr_select(np.ones(DIM), np.eye(DIM)[:3], k=5) == [0, 1, 2]
@@ -0,0 +1,53 @@
+import numpy as np
+from utils.qa_index import QAIndex, question_topic
+
+PAIRS = [
+    {"question": "What is fika?", "answer": "A coffee break with something sweet."},
+    {"question": "What is allemansrätten?", "answer": "The right of public access to nature."},
+    {"question": "Why do Swedes celebrate midsummer?", "answer": "To mark the longest day of the year."},
+]
+
+
+class QueryOnlyEmbeddings:
+    """Embeds by topic words; document embeddings are deliberately a different space."""
+
+    vocab = ["fika", "coffee", "allemansratten", "nature", "midsummer", "celebrate"]
+
+    def embed_query(self, text):
+        words = question_topic(text).split()
+        return [float(sum(w.startswith(v[:5]) for w in words)) + 0.01 for v in self.vocab]
+
+    def embed_documents(self, texts):
+        raise AssertionError("stored questions must be embedded as queries")
+
+
+def test_stored_questions_are_embedded_as_queries():
+    emb = QueryOnlyEmbeddings()
+    index = QAIndex(PAIRS, emb)
+    expected = np.array(emb.embed_query(PAIRS[2]["question"]), dtype=np.float32)
+    assert np.allclose(index.vectors[2], expected / np.linalg.norm(expected))
+
+    query = "midsummer celebrations"
+    hit = index.match(query, emb.embed_query(query))
+    assert hit["qa"] is PAIRS[2] and hit["confidence"] == "high"
+
+
+def test_exact_topic_is_high_confidence():
+    index = QAIndex(PAIRS)
+    for query in ("What's fika?", "what is FIKA in Sweden", "Tell me about fika please"):
+        hit = index.match(query)
+        assert hit["qa"] is PAIRS[0]
+        assert (hit["method"], hit["confidence"]) == ("exact", "high")
+
+
+def test_stored_topic_inside_a_longer_question_is_medium():
+    # The stored answer covers only part of the question, so it becomes prompt context
+    hit = QAIndex(PAIRS).match("what is fika and where can I get some in Malmö")
+    assert hit["qa"] is PAIRS[0]
+    assert (hit["method"], hit["confidence"]) == ("contains", "medium")
+
+
+def test_typos_match_through_trigrams():
+    hit = QAIndex(PAIRS).match("what is allemansrätt")
+    assert hit["qa"] is PAIRS[1] and hit["method"] == "trigram"
+    assert QAIndex(PAIRS).match("best ski resorts in Åre") is None
@@ -0,0 +1,91 @@
+import httpx
+import pytest
+from pydantic import ValidationError
+from service.schemas import SearchRequest
+from utils.poi_store import POIStore
+from utils.retrieval_client import HashRing, RetrievalClient, node_url
+
+URLS = ["http://127.0.0.1:8100", "http://127.0.0.1:8101", "http://127.0.0.1:8102"]
+SHARDS = [f"region-{i}" for i in range(50)]
+
+
+def test_node_url_strips_trailing_slash_and_whitespace():
+    assert node_url(" http://127.0.0.1:8100/ ") == "http://127.0.0.1:8100"
+    assert node_url("http://127.0.0.1:8100") == "http://127.0.0.1:8100"
+
+
+def test_ring_ownership_ignores_how_urls_were_written():
+    # The service builds its ring from RETRIEVAL_URLS, the client from its own list
+    written = [u + "/" for u in URLS]
+    server = HashRing([node_url(u) for u in written])
+    client = HashRing([node_url(u) for u in URLS])
+    assert [server.node_for(s) for s in SHARDS] == [client.node_for(s) for s in SHARDS]
+    assert {server.node_for(s) for s in SHARDS} == set(URLS)
+
+
+def test_removing_a_node_only_moves_its_shards():
+    full, reduced = HashRing(URLS), HashRing(URLS[:2])
+    for s in SHARDS:
+        if full.node_for(s) != URLS[2]:
+            assert reduced.node_for(s) == full.node_for(s)
+
+
+def client_with(handler):
+    dataset = POIStore([{"type": "schema:Place", "name": "Skansen", "latitude": 59.3, "longitude": 18.1}])
+    client = RetrievalClient(URLS[:1], dataset)
+
+    async def make():
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    client._http = client._call(make())
+    return client
+
+
+HIT = {"id": "a", "document": "name: Skansen", "metadata": {"poi_id": "a"}, "score": 0.9}
+
+
+def test_search_merges_service_hits():
+    client = client_with(lambda request: httpx.Response(200, json={"hits": [HIT]}))
+    docs = client.similarity_search("skansen", k=3)
+    assert [d.metadata["poi_id"] for d in docs] == ["a"]
+
+
+@pytest.mark.parametrize("response", [
+    httpx.Response(200, text="<html>proxy error</html>"),
+    httpx.Response(200, json=["not", "an", "object"]),
+    httpx.Response(200, json={"detail": "missing hits"}),
+    httpx.Response(503, text="unavailable"),
+])
+def test_broken_replies_count_as_node_errors(response):
+    client = client_with(lambda request: response)
+    assert client.similarity_search("skansen") == []
+    assert client.stats()["errors"] == 1 and client.stats()["rejected"] == 0
+
+
+def test_rejected_requests_are_told_apart_from_failures():
+    client = client_with(lambda request: httpx.Response(422, json={"detail": "bad filter"}))
+    assert client.similarity_search("skansen", filter={"city": {"$gt": 1}}) == []
+    assert client.stats()["rejected"] == 1 and client.stats()["errors"] == 0
+
+
+@pytest.mark.parametrize("flt", [
+    {"city": "Stockholm"},
+    {"city": {"$in": ["Stockholm", "Uppsala"]}},
+    {"$and": [{"region": "skane"}, {"type": {"$ne": "schema:Trip"}}]},
+    {"$or": [{"poi_id": {"$in": ["a", "b"]}}, {"city": {"$eq": "Lund"}}]},
+])
+def test_schema_accepts_supported_filters(flt):
+    assert SearchRequest(query="q", filter=flt).filter == flt
+
+
+@pytest.mark.parametrize("flt", [
+    {"city": {"$gt": 3}},
+    {"city": {"$in": "Stockholm"}},
+    {"city": {"$eq": ["a"]}},
+    {"city": ["Stockholm", "Lund"]},
+    {"$and": {"city": "Lund"}},
+    {"$not": {"city": "Lund"}},
+])
+def test_schema_rejects_malformed_filters(flt):
+    with pytest.raises(ValidationError):
+        SearchRequest(query="q", filter=flt)
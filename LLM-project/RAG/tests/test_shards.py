@@ -0,0 +1,75 @@
+import os
+import pytest
+from utils.lexical_index import BM25Index
+from utils.local_embeddings import HashingEmbeddings
+from utils.poi_store import POIStore
+from utils.shards import build_shards, lexical_path, ShardedStore
+
+REGIONS = ["stockholm", "skane", "uppsala-lan", "gavleborg", "jamtland", "norrbotten"]
+KINDS = ["museum with old paintings", "castle by the lake", "cafe serving cinnamon buns", "hiking trail in the forest"]
+
+
+def records():
+    out = []
+    for i, region in enumerate(REGIONS):
+        for j, kind in enumerate(KINDS):
+            out.append({
+                "type": "schema:Place", "name": f"{region.title()} {kind.split()[0]} {j}",
+                "description": f"A {kind} in {region}.", "city": f"Town {i}",
+                "region": f"http://data.visitsweden.com/region/{region}",
+                "latitude": 56 + i, "longitude": 14 + j / 10,
+            })
+    return out
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("shards"))
+    dataset = POIStore(records())
+    embeddings = HashingEmbeddings(dim=64, workers=1)
+    build_shards(dataset, embeddings, directory)
+    return dataset, embeddings, directory
+
+
+def test_bm25_is_stored_with_each_shard(built):
+    _, _, directory = built
+    for region in REGIONS:
+        path = os.path.join(directory, f"{region}.npz")
+        lexical = BM25Index.load(lexical_path(path))
+        assert len(lexical) == len(KINDS)
+        assert lexical.search("cinnamon buns", 1)
+
+
+def test_repeated_unfiltered_queries_do_not_reload_shards(built):
+    dataset, embeddings, directory = built
+    store = ShardedStore(dataset, embeddings, directory, max_resident=3, workers=4)
+    store.similarity_search("castle by the lake", k=4)
+    store.lexical.search("castle lake", k=4)
+    first = store.stats()
+    assert first["loads"] == 3 and first["evictions"] == 0
+
+    for _ in range(5):
+        docs = store.similarity_search("museum with paintings", k=6)
+        assert len(docs) == 6
+        assert store.lexical.search("hiking trail", k=6)
+    stats = store.stats()
+    assert stats["loads"] == first["loads"]
+    assert stats["evictions"] == 0
+    assert stats["resident"] == first["resident"]
+
+
+def test_filtered_queries_still_cache_their_shards(built):
+    dataset, embeddings, directory = built
+    store = ShardedStore(dataset, embeddings, directory, max_resident=3, workers=4)
+    for _ in range(3):
+        docs = store.similarity_search("castle", k=2, filter={"region": "jamtland"})
+        assert docs and all("jamtland" in d.metadata.get("region", d.page_content) for d in docs)
+    assert store.stats()["loads"] == 1 and store.stats()["streamed"] == 0
+
+
+def test_all_shards_resident_when_they_fit(built):
+    dataset, embeddings, directory = built
+    store = ShardedStore(dataset, embeddings, directory, max_resident=len(REGIONS), workers=4)
+    for _ in range(3):
+        store.similarity_search("cafe", k=4)
+    assert store.stats()["loads"] == len(REGIONS) and store.stats()["streamed"] == 0
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from utils.geo_utils import haversine_np, find_nearby_places
+from utils.spatial_index import GridIndex, PartitionedIndex
+
+QUERIES = [(59.33, 18.07), (57.70, 11.97), (67.85, 20.23), (55.60, 13.00), (62.0, 15.0)]
+
+
+@pytest.fixture(scope="module")
+def coords():
+    rng = np.random.default_rng(0)
+    # Dense cities plus scattered countryside, with a few rows missing coordinates
+    centers = np.array(QUERIES[:4])
+    city = centers[rng.integers(0, len(centers), 1500)] + rng.normal(0, 0.05, (1500, 2))
+    rural = np.column_stack([rng.uniform(55.3, 69.0, 1500), rng.uniform(11.0, 24.0, 1500)])
+    pts = np.vstack([city, rural])
+    pts[rng.choice(len(pts), 30, replace=False)] = np.nan
+    return pts
+
+
+def brute(coords, lat, lon):
+    ok = np.flatnonzero(~np.isnan(coords).any(axis=1))
+    return ok, haversine_np(lat, lon, coords[ok, 0], coords[ok, 1])
+
+
+@pytest.mark.parametrize("cell_deg", [0.05, 0.1, 0.5])
+def test_radius_matches_brute_force(coords, cell_deg):
+    index = GridIndex(coords, cell_deg=cell_deg)
+    for lat, lon in QUERIES:
+        for radius_km in (1, 10, 75):
+            rows, dist = index.radius(lat, lon, radius_km)
+            ok, d = brute(coords, lat, lon)
+            assert set(rows) == set(ok[d <= radius_km])
+            assert np.all(np.diff(dist) >= 0)
+            assert np.allclose(dist, haversine_np(lat, lon, coords[rows, 0], coords[rows, 1]))
+
+
+def test_radius_limit_keeps_the_closest(coords):
+    index = GridIndex(coords)
+    rows, dist = index.radius(59.33, 18.07, 50, limit=10)
+    ok, d = brute(coords, 59.33, 18.07)
+    assert len(rows) == 10
+    assert np.allclose(dist, np.sort(d[d <= 50])[:10])
+
+
+@pytest.mark.parametrize("k", [1, 7, 50])
+def test_nearest_matches_brute_force(coords, k):
+    index = GridIndex(coords)
+    for lat, lon in QUERIES:
+        rows, dist = index.nearest(lat, lon, k)
+        _, d = brute(coords, lat, lon)
+        assert np.allclose(dist, np.sort(d)[:k])
+
+
+def test_expanding_grows_until_k_points(coords):
+    index = GridIndex(coords)
+    rows, dist = index.expanding(62.0, 15.0, 5, radius_km=1)
+    assert len(rows) == 5
+    rows, dist = index.expanding(62.0, 15.0, 5, radius_km=1, max_radius_km=2)
+    assert np.all(dist <= 2)
+
+
+def test_missing_coordinates_are_skipped(coords):
+    index = GridIndex(coords)
+    assert len(index) == int((~np.isnan(coords).any(axis=1)).sum())
+    assert not np.isnan(coords[index.rows]).any()
+
+
+def test_partitions_filter_by_type(coords):
+    types = ["schema:FoodEstablishment" if i % 3 == 0 else "schema:Place" for i in range(len(coords))]
+    index = PartitionedIndex(coords, types)
+    rows, _ = index.nearest(59.33, 18.07, 20, place_type="schema:FoodEstablishment")
+    assert len(rows) == 20 and all(r % 3 == 0 for r in rows)
+    rows, _ = index.radius(59.33, 18.07, 100, place_type="schema:Museum")
+    assert len(rows) == 0
+
+
+def test_nearby_search_never_passes_the_cap():
+    # Restaurants only in Stockholm; the follow-up is asked from Kiruna, ~950 km away
+    food = [{"type": "schema:FoodEstablishment", "name": f"Krog {i}", "latitude": 59.33 + i / 1000,
+             "longitude": 18.07} for i in range(10)]
+    near = [{"type": "schema:FoodEstablishment", "name": "Kiruna krog", "latitude": 67.87, "longitude": 20.30}]
+    dataset = food + near
+    places = find_nearby_places(dataset, 67.85, 20.23, 20, limit=6,
+                                place_type="schema:FoodEstablishment", max_radius_km=40)
+    assert [p["name"] for p in places] == ["Kiruna krog"]
+    assert all(p["distance_km"] <= 40 for p in places)
+
+    # The radius still grows up to the cap to fill the limit
+    places = find_nearby_places(dataset, 59.0, 18.07, 20, limit=6,
+                                place_type="schema:FoodEstablishment", max_radius_km=80)
+    assert len(places) == 6 and all(p["distance_km"] <= 80 for p in places)
+    assert find_nearby_places(dataset, 59.0, 18.07, 20, limit=6, place_type="schema:FoodEstablishment") == []
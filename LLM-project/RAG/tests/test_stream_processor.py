@@ -0,0 +1,74 @@
+import random
+import pytest
+from utils.stream_processor import StreamProcessor, RenderThrottle
+from utils.text_utils import preserve_swedish_names, sanitize_output, REFUSAL
+
+TEXTS = [
+    "Gothenburg is lovely in summer. From Gothenburg, take the train to Orebro and then Gavle.",
+    "Drive through Vastra Gotaland and Varmland; Angelholm has a long beach. Ostergotland too!",
+    "Gavleborg is not Gavle, and Gothenburgers live in Gothenburg (Gothenburg's harbour).",
+    "A plain answer about fika, cinnamon buns and Stockholm's archipelago without renames.",
+    "Stay away from Gothenburg at rush hour; nobody wants to kill time in traffic.",
+]
+
+
+def chunked(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(0, min(40, len(text) - 1))))
+    return [text[a:b] for a, b in zip([0, *cuts], [*cuts, len(text)])]
+
+
+def reference(text):
+    return preserve_swedish_names(sanitize_output(text))
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_matches_full_text_processing_under_random_chunking(seed):
+    rng = random.Random(seed)
+    for text in TEXTS:
+        proc = StreamProcessor()
+        seen = ""
+        for chunk in chunked(text, rng):
+            proc.feed(chunk)
+            seen += chunk
+            assert proc.text == reference(seen)
+        assert proc.raw == text
+        assert proc.text == reference(text)
+
+
+def test_banned_word_split_across_chunks_is_caught():
+    proc = StreamProcessor()
+    for chunk in ["Nothing to k", "i", "ll here"]:
+        proc.feed(chunk)
+    assert proc.blocked
+    assert proc.text == REFUSAL
+    proc.feed(" and more text")
+    assert proc.text == REFUSAL
+    assert proc.raw.endswith("and more text")
+
+
+def test_single_character_chunks():
+    text = TEXTS[0]
+    proc = StreamProcessor()
+    for ch in text:
+        proc.feed(ch)
+    assert proc.text == reference(text)
+
+
+def test_empty_chunks_are_ignored():
+    proc = StreamProcessor()
+    for chunk in ["", "Gothenburg", "", " rocks", ""]:
+        proc.feed(chunk)
+    assert proc.text == "Göteborg rocks"
+
+
+def test_render_throttle_limits_rate(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("utils.stream_processor.time.monotonic", lambda: now[0])
+    throttle = RenderThrottle(fps=8)
+    due = []
+    for _ in range(64):
+        due.append(throttle.due())
+        now[0] += 1 / 64
+    # 64 calls over one second at 8 fps
+    assert sum(due) == 8
+    assert due[0]
@@ -0,0 +1,374 @@
+"""
+In-process IVF (inverted file) vector index, an alternative to Chroma.
+
+Vectors are L2-normalized and clustered with spherical k-means into
+`nlist` lists; rows are stored grouped by list so each list is one
+contiguous slice of the matrix. A query scores the centroids, scans the
+`nprobe` best lists and returns the top k by cosine similarity. Larger
+nprobe raises recall at the cost of latency; nprobe == nlist is exact.
+Filtered searches (geo candidate ids, city/region/type) resolve to
+row sets through posting lists and score only those rows, which is
+exact and cheaper than probing.
+
+The whole index (vectors, centroids, ids, texts, metadata, content
+hashes) is saved as a single .npz file.
+
+With quantization="int8" only compact codes stay in RAM: vectors are
+optionally PCA-reduced, then stored as per-dimension scaled int8. The
+codes give a coarse top-N which is rescored exactly against the float32
+vectors, kept in a .vectors.npy sidecar and memory-mapped so only the
+rows being reranked are ever read from disk.
+"""
+import json
+import os
+import time
+import numpy as np
+from langchain.schema import Document
+from config import TOP_K, IVF_NLIST, IVF_NPROBE, ANN_RERANK
+from utils.poi_store import FILTER_FIELDS, filter_rows
+
+
+def _normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _pack(strings):
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack(blob, offsets, i):
+    return blob[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8")
+
+
+def spherical_kmeans(x, nlist, iters=10, seed=0, block=8192):
+    """Centroids (nlist, dim) and assignments for normalized rows of x."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), nlist, replace=False)].copy()
+    assign = np.zeros(len(x), dtype=np.int32)
+    for _ in range(iters):
+        for s in range(0, len(x), block):
+            assign[s:s + block] = np.argmax(x[s:s + block] @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists with random rows so no list is wasted
+            sums[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    for s in range(0, len(x), block):
+        assign[s:s + block] = np.argmax(x[s:s + block] @ centroids.T, axis=1)
+    return centroids, assign
+
+
+def vectors_path(path):
+    """Sidecar holding full-precision vectors of a quantized index."""
+    return os.path.splitext(path)[0] + ".vectors.npy"
+
+
+class Int8Quantizer:
+    """Optional PCA projection followed by symmetric per-dimension int8 codes."""
+
+    def __init__(self, components, scale):
+        self.components = components
+        self.scale = scale
+
+    @classmethod
+    def fit(cls, x, dim=None, sample=20000, seed=0):
+        components = None
+        if dim and dim < x.shape[1]:
+            rng = np.random.default_rng(seed)
+            s = x[rng.choice(len(x), min(sample, len(x)), replace=False)]
+            _, _, vt = np.linalg.svd(s - s.mean(axis=0), full_matrices=False)
+            components = np.ascontiguousarray(vt[:dim], dtype=np.float32)
+        q = cls(components, None)
+        scale = np.abs(q.project(x)).max(axis=0) / 127.0
+        q.scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+        return q
+
+    def project(self, x):
+        return x if self.components is None else x @ self.components.T
+
+    def encode(self, x):
+        return np.clip(np.rint(self.project(x) / self.scale), -127, 127).astype(np.int8)
+
+    def query(self, q):
+        """Query transformed so that codes @ query approximates the projected dot product."""
+        return (self.project(q) * self.scale).astype(np.float32)
+
+
+def _matches(meta, flt):
+    """Subset of Chroma's where-filter: equality, $eq, $in, $ne, $nin, $and, $or."""
+    for key, cond in flt.items():
+        if key == "$and":
+            if not all(_matches(meta, f) for f in cond):
+                return False
+        elif key == "$or":
+            if not any(_matches(meta, f) for f in cond):
+                return False
+        elif isinstance(cond, dict):
+            v = meta.get(key)
+            for op, arg in cond.items():
+                if op == "$eq" and v != arg or op == "$ne" and v == arg:
+                    return False
+                if op == "$in" and v not in arg or op == "$nin" and v in arg:
+                    return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+
+def _top(scores, k):
+    """Indices of the k largest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class IVFIndex:
+    """Approximate cosine top-k over a NumPy matrix with inverted lists."""
+
+    def __init__(self, vectors, centroids, list_offsets, ids, doc_blob, doc_offsets,
+                 meta_blob, meta_offsets, hashes, info=None, nprobe=IVF_NPROBE,
+                 codes=None, quantizer=None, rerank=ANN_RERANK):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.ids = ids
+        self._doc = (doc_blob, doc_offsets)
+        self._meta = (meta_blob, meta_offsets)
+        self.hashes = hashes
+        self.info = info or {}
+        self.nprobe = nprobe
+        self.codes = codes
+        self.quantizer = quantizer
+        self.rerank = rerank
+        self._row_by_id = {pid: i for i, pid in enumerate(ids)}
+        self._postings = None
+
+    @classmethod
+    def build(cls, ids, vectors, documents, metadatas, hashes=None, nlist=None, info=None, seed=0,
+              quantization=None, pca_dim=None):
+        """Cluster and lay out an index; nlist defaults to ~sqrt(n).
+
+        quantization="int8" adds coarse codes (after PCA to pca_dim, if given).
+        """
+        n = len(ids)
+        x = _normalize(np.asarray(vectors, dtype=np.float32).reshape(n, -1) if n else np.zeros((0, 1)))
+        nlist = max(1, min(n, nlist or IVF_NLIST or int(np.sqrt(n)))) if n else 1
+        if n:
+            centroids, assign = spherical_kmeans(x, nlist, seed=seed)
+        else:
+            centroids, assign = np.zeros((1, x.shape[1]), dtype=np.float32), np.zeros(0, dtype=np.int32)
+        order = np.argsort(assign, kind="stable")
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=len(centroids)), out=list_offsets[1:])
+        doc_blob, doc_offsets = _pack([documents[i] for i in order])
+        meta_blob, meta_offsets = _pack([json.dumps(metadatas[i], ensure_ascii=False) for i in order])
+        hashes = hashes or [""] * n
+        x = x[order]
+        codes = quantizer = None
+        if quantization == "int8" and n:
+            quantizer = Int8Quantizer.fit(x, pca_dim, seed=seed)
+            codes = quantizer.encode(x)
+        elif quantization not in (None, "int8"):
+            raise ValueError(f"Unknown quantization: {quantization}")
+        return cls(
+            x, centroids, list_offsets, [ids[i] for i in order],
+            doc_blob, doc_offsets, meta_blob, meta_offsets, [hashes[i] for i in order], info,
+            codes=codes, quantizer=quantizer,
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def save(self, path):
+        arrays = dict(
+            centroids=self.centroids, list_offsets=self.list_offsets,
+            ids=np.array(self.ids, dtype=str), doc_blob=self._doc[0], doc_offsets=self._doc[1],
+            meta_blob=self._meta[0], meta_offsets=self._meta[1],
+            hashes=np.array(self.hashes, dtype=str), info=np.array(json.dumps(self.info)),
+        )
+        if self.codes is None:
+            arrays["vectors"] = self.vectors
+        else:
+            arrays["codes"] = self.codes
+            arrays["q_scale"] = self.quantizer.scale
+            if self.quantizer.components is not None:
+                arrays["q_components"] = self.quantizer.components
+            tmp = vectors_path(path) + ".tmp.npy"
+            np.save(tmp, np.ascontiguousarray(self.vectors))
+            os.replace(tmp, vectors_path(path))
+            # Serve the exact rerank from the file from now on, not from the build-time copy
+            self.vectors = np.load(vectors_path(path), mmap_mode="r")
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, nprobe=IVF_NPROBE, rerank=ANN_RERANK):
+        with np.load(path) as z:
+            quantized = "codes" in z.files
+            if quantized:
+                vectors = np.load(vectors_path(path), mmap_mode="r")
+                quantizer = Int8Quantizer(z["q_components"] if "q_components" in z.files else None, z["q_scale"])
+            else:
+                vectors, quantizer = z["vectors"], None
+            return cls(
+                vectors, z["centroids"], z["list_offsets"], z["ids"].tolist(),
+                z["doc_blob"], z["doc_offsets"], z["meta_blob"], z["meta_offsets"],
+                z["hashes"].tolist(), json.loads(str(z["info"])), nprobe,
+                codes=z["codes"] if quantized else None, quantizer=quantizer, rerank=rerank,
+            )
+
+    def document(self, row):
+        return _unpack(*self._doc, row)
+
+    def metadata(self, row):
+        return json.loads(_unpack(*self._meta, row))
+
+    def row_of(self, poi_id):
+        return self._row_by_id.get(poi_id)
+
+    def postings(self):
+        """{field: {value: rows}} for the filterable metadata fields, built on first use."""
+        if self._postings is None:
+            lists = {f: {} for f in FILTER_FIELDS}
+            for row in range(len(self)):
+                meta = self.metadata(row)
+                for f in FILTER_FIELDS:
+                    if meta.get(f) is not None:
+                        lists[f].setdefault(meta[f], []).append(row)
+            self._postings = {f: {v: np.array(r, dtype=np.int32) for v, r in d.items()} for f, d in lists.items()}
+        return self._postings
+
+    def _allowed_rows(self, flt):
+        rows = filter_rows(flt, self.postings(), self._row_by_id)
+        if rows is not None:
+            return rows
+        # Filters the posting lists cannot answer fall back to a metadata scan
+        return np.array([i for i in range(len(self)) if _matches(self.metadata(i), flt)], dtype=np.int64)
+
+    def search(self, query, k=TOP_K, nprobe=None, filter=None, rerank=None):
+        """(rows, cosine similarities) of the best k matches, best first.
+
+        On a quantized index the codes pick the best max(k, rerank) candidates
+        and only those are scored against the full vectors.
+        """
+        if not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        q = _normalize(query).ravel()
+        if filter:
+            rows = self._allowed_rows(filter)
+        else:
+            nprobe = min(nprobe or self.nprobe, self.nlist)
+            lists = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+            rows = np.concatenate([np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in lists])
+        if self.codes is not None:
+            coarse = self.codes[rows].astype(np.float32) @ self.quantizer.query(q)
+            rows = np.sort(rows[_top(coarse, max(k, rerank or self.rerank))])
+        if not len(rows):
+            return rows, np.zeros(0, dtype=np.float32)
+        scores = np.asarray(self.vectors[rows]) @ q
+        top = _top(scores, k)
+        return rows[top], scores[top]
+
+    def exact_search(self, query, k=TOP_K):
+        """Brute-force top k over the full-precision vectors (ground truth for benchmarks)."""
+        q = _normalize(query).ravel()
+        scores = np.asarray(self.vectors) @ q
+        top = _top(scores, k)
+        return top, scores[top]
+
+    def memory_usage(self):
+        # A saved quantized index keeps its full vectors on disk (memory-mapped)
+        total = (self.centroids.nbytes + self._doc[0].nbytes + self._meta[0].nbytes
+                 + self._doc[1].nbytes + self._meta[1].nbytes)
+        if self.codes is None or not isinstance(self.vectors, np.memmap):
+            total += self.vectors.nbytes
+        if self.codes is None:
+            return total
+        total += self.codes.nbytes + self.quantizer.scale.nbytes
+        if self.quantizer.components is not None:
+            total += self.quantizer.components.nbytes
+        return total
+
+
+class ANNVectorStore:
+    """The slice of the LangChain vector store API the app uses, served by an IVFIndex."""
+
+    def __init__(self, index, embeddings):
+        self.index = index
+        self.embeddings = embeddings
+
+    def _docs(self, rows):
+        return [Document(page_content=self.index.document(r), metadata=self.index.metadata(r)) for r in rows]
+
+    def similarity_search_by_vector(self, embedding, k=TOP_K, filter=None, **kwargs):
+        rows, _ = self.index.search(embedding, k, filter=filter)
+        return self._docs(rows)
+
+    def similarity_search(self, query, k=TOP_K, filter=None, **kwargs):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k, filter)
+
+    def similarity_search_with_score(self, query, k=TOP_K, filter=None, **kwargs):
+        """(doc, cosine distance) pairs; lower is closer, as with Chroma."""
+        rows, sims = self.index.search(self.embeddings.embed_query(query), k, filter=filter)
+        return list(zip(self._docs(rows), (1.0 - sims).tolist()))
+
+    def similarity_search_with_relevance_scores(self, query, k=TOP_K, filter=None, **kwargs):
+        """(doc, relevance in [0, 1]) pairs; higher is better."""
+        rows, sims = self.index.search(self.embeddings.embed_query(query), k, filter=filter)
+        return list(zip(self._docs(rows), ((1.0 + sims) / 2).tolist()))
+
+    def get(self, ids=None, include=("documents", "metadatas")):
+        """Chroma-style lookup by id: {"ids", "documents", "metadatas", "embeddings"}, unknown ids skipped."""
+        rows = range(len(self.index)) if ids is None else [r for r in map(self.index.row_of, ids) if r is not None]
+        rows = list(rows)
+        return {
+            "ids": [self.index.ids[r] for r in rows],
+            "documents": [self.index.document(r) for r in rows] if "documents" in include else None,
+            "metadatas": [self.index.metadata(r) for r in rows] if "metadatas" in include else None,
+            "embeddings": np.asarray(self.index.vectors[rows]) if "embeddings" in include else None,
+        }
+
+    def memory_usage(self):
+        return self.index.memory_usage()
+
+
+def benchmark(index, queries, k=TOP_K, nprobes=(1, 2, 4, 8, 16, 32), reranks=(None,)):
+    """Recall@k against brute-force exact search and mean latency per (nprobe, rerank)."""
+    start = time.perf_counter()
+    exact = [set(index.exact_search(q, k)[0].tolist()) for q in queries]
+    report = [{"nprobe": "exact", "rerank": None, "recall": 1.0,
+               "ms": round((time.perf_counter() - start) * 1000 / len(queries), 3)}]
+    for nprobe in nprobes:
+        for rerank in reranks:
+            start = time.perf_counter()
+            found = [set(index.search(q, k, nprobe=nprobe, rerank=rerank)[0].tolist()) for q in queries]
+            ms = (time.perf_counter() - start) * 1000 / len(queries)
+            recall = np.mean([len(f & e) / max(1, len(e)) for f, e in zip(found, exact)])
+            report.append({"nprobe": nprobe, "rerank": rerank, "recall": round(float(recall), 3), "ms": round(ms, 3)})
+    return report
+
+
+if __name__ == "__main__":
+    from config import ANN_INDEX_PATH
+    index = IVFIndex.load(ANN_INDEX_PATH)
+    sample = np.random.default_rng(0).choice(len(index), min(200, len(index)), replace=False)
+    queries = np.asarray(index.vectors[np.sort(sample)])
+    reranks = (16, 32, 64, 128) if index.codes is not None else (None,)
+    print(f"{len(index)} vectors, {index.nlist} lists, {index.memory_usage() / 1e6:.1f} MB resident")
+    for row in benchmark(index, queries, reranks=reranks):
+        print(row)
@@ -0,0 +1,106 @@
+"""
+Semantic cache of generated answers.
+
+An answer is reused for a new question when the retrieval step returned
+the same set of documents and the question embedding is within
+ANSWER_CACHE_THRESHOLD cosine similarity of one asked before, so
+rephrasings ("best museums in Göteborg?" / "which museums should I see in
+Gothenburg") skip the LLM call. Requiring the same supporting documents
+keeps the answer grounded in what the new question would have been
+given. Entries expire after a TTL and the least recently used are
+evicted past ANSWER_CACHE_MAX_ENTRIES. Documents are keyed by poi_id,
+or by a hash of their text when they have none, so two different
+document sets never share a key.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from config import ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_S
+
+
+def doc_keys(docs):
+    """Cache key part for each document: its poi_id, else a hash of its text."""
+    return [d.metadata.get("poi_id") or "sha1:" + hashlib.sha1(d.page_content.encode("utf-8")).hexdigest()
+            for d in docs]
+
+
+def _unit(v):
+    v = np.asarray(v, dtype=np.float32)
+    n = np.linalg.norm(v)
+    return v / n if n else v
+
+
+class SemanticAnswerCache:
+    """Thread-safe answer cache keyed by (prompt variant, doc-id set), matched on query similarity."""
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL_S):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # entry id -> (group, unit vector, answer, inserted)
+        self._groups = {}  # (variant, doc-id set) -> [entry id]
+        self._next = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    @staticmethod
+    def _group(doc_ids, variant):
+        return variant, frozenset(doc_ids)
+
+    def _drop(self, eid):
+        group = self._entries.pop(eid)[0]
+        members = self._groups[group]
+        members.remove(eid)
+        if not members:
+            del self._groups[group]
+
+    def get(self, query_vec, doc_ids, variant=None):
+        """Cached answer for a question this similar over the same documents, else None."""
+        q = _unit(query_vec)
+        now = time.monotonic()
+        with self._lock:
+            members = self._groups.get(self._group(doc_ids, variant), [])
+            for eid in [e for e in members if now - self._entries[e][3] > self.ttl]:
+                self._drop(eid)
+            members = self._groups.get(self._group(doc_ids, variant), [])
+            if members:
+                sims = np.stack([self._entries[e][1] for e in members]) @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    eid = members[best]
+                    self._entries.move_to_end(eid)
+                    self.hits += 1
+                    return self._entries[eid][2]
+            self.misses += 1
+            return None
+
+    def put(self, query_vec, doc_ids, answer, variant=None):
+        group = self._group(doc_ids, variant)
+        with self._lock:
+            eid = self._next
+            self._next += 1
+            self._entries[eid] = (group, _unit(query_vec), answer, time.monotonic())
+            self._groups.setdefault(group, []).append(eid)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+            "evictions": self.evictions,
+        }
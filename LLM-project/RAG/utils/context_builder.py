@@ -0,0 +1,173 @@
+"""
+Token-budgeted prompt context.
+
+Retrieved documents are serialized compactly (one header line with name,
+place and street, then the descriptive text), presentation-only fields
+(images, map links, coordinates) are left out, sentences already given
+for an earlier document are not repeated, and documents are added in
+relevance order until CONTEXT_TOKEN_BUDGET is spent. When relevance
+scores are available, documents that score far below the best one are
+dropped first (adaptive k). Restaurant ratings and the recent
+conversation get their own small budgets.
+
+Token counts are estimated locally (about four characters per token for
+words, one per punctuation mark), which tracks the Gemini tokenizer
+closely enough for budgeting without a network call.
+"""
+import html
+import re
+import numpy as np
+from config import (
+    CONTEXT_TOKEN_BUDGET, CONTEXT_SCORE_DROP, CONTEXT_MIN_DOCS, RESTAURANT_TOKEN_BUDGET, HISTORY_TOKEN_BUDGET,
+)
+
+_WORD = re.compile(r"\w+")
+_PUNCT = re.compile(r"[^\w\s]")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_FIELD = re.compile(r"^(\w+): (.*)$")
+HEADER_FIELDS = ("name", "city", "region", "street")
+TEXT_FIELDS = ("description", "facts_text")
+
+
+def estimate_tokens(text):
+    """Approximate LLM token count of text."""
+    return sum((len(w) + 3) // 4 for w in _WORD.findall(text)) + len(_PUNCT.findall(text))
+
+
+def truncate_to_tokens(text, budget):
+    """Longest prefix of whole sentences (or words, for the first one) within budget tokens."""
+    if estimate_tokens(text) <= budget:
+        return text
+    out = ""
+    for sentence in _SENTENCE.split(text):
+        candidate = f"{out} {sentence}".strip()
+        if estimate_tokens(candidate) > budget:
+            break
+        out = candidate
+    if out:
+        return out
+    words = []
+    for w in text.split():
+        if estimate_tokens(" ".join(words + [w, "…"])) > budget:
+            break
+        words.append(w)
+    return " ".join(words) + "…" if words else ""
+
+
+def _fact_key(sentence):
+    return " ".join(_WORD.findall(sentence.lower()))
+
+
+def _fields(page_content):
+    fields = {}
+    for line in page_content.splitlines():
+        m = _FIELD.match(line)
+        if m:
+            fields[m.group(1)] = html.unescape(m.group(2).strip())
+        elif fields and line.strip():
+            # Continuation of a multi-line value
+            last = next(reversed(fields))
+            fields[last] += " " + html.unescape(line.strip())
+    return fields
+
+
+def compact_doc(doc, seen=None):
+    """Compact text for one document; sentences whose key is in `seen` are skipped (and new ones added)."""
+    seen = set() if seen is None else seen
+    f = _fields(doc.page_content)
+    region = f.get("region", "")
+    if region.startswith("http"):
+        region = region.rstrip("/").rsplit("/", 1)[-1]
+    place = ", ".join(v for v in (f.get("city"), region) if v)
+    header = " — ".join(v for v in (f.get("name") or doc.metadata.get("name"), place, f.get("street")) if v)
+
+    facts = []
+    for field in TEXT_FIELDS:
+        for sentence in _SENTENCE.split(f.get(field, "")):
+            key = _fact_key(sentence)
+            if key and key not in seen and key != _fact_key(f.get("name", "")):
+                seen.add(key)
+                facts.append(sentence.strip())
+    extras = [f"{k.replace('_', '-')}: {v}" for k, v in f.items()
+              if k not in HEADER_FIELDS and k not in TEXT_FIELDS and v]
+    if doc.metadata.get("url"):
+        extras.append(f"web: {doc.metadata['url']}")
+    body = " ".join(facts)
+    if extras:
+        body = f"{body} ({'; '.join(extras)})" if body else "; ".join(extras)
+    return f"{header}\n{body}" if body else header
+
+
+def relevance_scores(query_vec, docs, vectors):
+    """Cosine similarity of each doc's stored vector ({poi_id: vector}) to the query; None if unknown."""
+    q = np.asarray(query_vec, dtype=np.float32)
+    q = q / max(float(np.linalg.norm(q)), 1e-12)
+    scores = []
+    for d in docs:
+        v = vectors.get(d.metadata.get("poi_id"))
+        if v is None:
+            scores.append(None)
+            continue
+        v = np.asarray(v, dtype=np.float32)
+        scores.append(float(v @ q / max(float(np.linalg.norm(v)), 1e-12)))
+    return scores
+
+
+def adaptive_cut(docs, scores, drop=CONTEXT_SCORE_DROP, min_docs=CONTEXT_MIN_DOCS):
+    """Docs (order kept) whose score is within `drop` of the best; docs without a score are kept."""
+    known = [s for s in scores if s is not None]
+    if not known:
+        return list(docs)
+    floor = max(known) - drop
+    kept = [d for i, (d, s) in enumerate(zip(docs, scores)) if i < min_docs or s is None or s >= floor]
+    return kept
+
+
+def build_context(docs, budget=CONTEXT_TOKEN_BUDGET, scores=None):
+    """(context text, docs used) filling at most `budget` tokens in relevance order."""
+    if scores is not None:
+        docs = adaptive_cut(docs, scores)
+    seen, parts, used, spent = set(), [], [], 0
+    for d in docs:
+        text = compact_doc(d, seen)
+        cost = estimate_tokens(text) + 2
+        if spent + cost > budget:
+            # Fit what is left of the budget with the head of this document, then stop
+            text = truncate_to_tokens(text, budget - spent - 2)
+            if estimate_tokens(text) >= 20:
+                parts.append(text)
+                used.append(d)
+            break
+        parts.append(text)
+        used.append(d)
+        spent += cost
+    return "\n\n".join(f"[{i + 1}] {p}" for i, p in enumerate(parts)), used
+
+
+def compact_restaurants(rows, budget=RESTAURANT_TOKEN_BUDGET):
+    """One line per rated restaurant (no links), best first, within budget tokens."""
+    lines, spent = [], 0
+    for r in rows:
+        line = (f"{r.get('name', '?')} — {r.get('rating', '?')}/5 ({r.get('userRatingCount', '?')} reviews), "
+                f"{r.get('formattedAddress', 'N/A')}")
+        cost = estimate_tokens(line) + 1
+        if spent + cost > budget:
+            break
+        lines.append(line)
+        spent += cost
+    return "\n".join(lines)
+
+
+def compact_history(messages, budget=HISTORY_TOKEN_BUDGET):
+    """Most recent chat turns as "Role: text" lines, newest kept first, within budget tokens."""
+    lines, spent = [], 0
+    per_turn = max(budget // max(len(messages), 1), 20)
+    for m in reversed(messages):
+        text = re.sub(r"<[^>]+>", "", m["content"])
+        line = f"{'User' if m['role'] == 'user' else 'Assistant'}: {truncate_to_tokens(' '.join(text.split()), per_turn)}"
+        cost = estimate_tokens(line) + 1
+        if spent + cost > budget:
+            break
+        lines.append(line)
+        spent += cost
+    return "\n".join(reversed(lines))
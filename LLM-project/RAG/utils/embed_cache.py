@@ -0,0 +1,191 @@
+"""
+Persistent embedding cache: SQLite index + NumPy memmap vector slabs.
+
+Entries are keyed by (namespace, sha1(text)), where the namespace is the
+embedding model plus "document"/"query" (Google embeds the two with
+different task types). Vectors live in one float32 memmap per dimension;
+SQLite maps keys to slots and tracks last use for LRU eviction once
+max_entries is exceeded. CachedEmbeddings wraps any LangChain embeddings
+backend so both index builds and live queries go through the cache.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config import EMBED_CACHE_DIR, EMBED_CACHE_MAX_ENTRIES
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    ns TEXT NOT NULL, key TEXT NOT NULL, dim INTEGER NOT NULL,
+    slot INTEGER NOT NULL, last_used REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used);
+CREATE TABLE IF NOT EXISTS free_slots (dim INTEGER NOT NULL, slot INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS slabs (dim INTEGER PRIMARY KEY, next_slot INTEGER NOT NULL);
+"""
+
+
+def text_key(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Disk-backed, size-bounded (LRU) map from (namespace, text) to a float32 vector."""
+
+    def __init__(self, directory=None, max_entries=EMBED_CACHE_MAX_ENTRIES):
+        self.directory = directory or EMBED_CACHE_DIR
+        self.max_entries = max_entries
+        os.makedirs(self.directory, exist_ok=True)
+        # Autocommit mode: every read-modify-write below opens its own BEGIN IMMEDIATE
+        # transaction, so processes sharing the directory never hand out the same slot
+        self._db = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), timeout=30,
+                                   check_same_thread=False, isolation_level=None)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._slabs = {}
+        self.hits = self.misses = self.evictions = 0
+
+    def _slab(self, dim, min_slots=0):
+        """Memmap for one dimension, grown (doubling) to hold at least min_slots rows."""
+        mm = self._slabs.get(dim)
+        if mm is not None and mm.shape[0] >= min_slots:
+            return mm
+        path = os.path.join(self.directory, f"vectors_{dim}.f32")
+        have = os.path.getsize(path) // (4 * dim) if os.path.exists(path) else 0
+        rows = max(have, 1024)
+        while rows < min_slots:
+            rows *= 2
+        if mm is not None:
+            mm.flush()
+        if rows > have:
+            with open(path, "ab") as f:
+                f.truncate(rows * dim * 4)
+        mm = np.memmap(path, dtype=np.float32, mode="r+", shape=(rows, dim))
+        self._slabs[dim] = mm
+        return mm
+
+    @contextmanager
+    def _write(self):
+        """One write transaction, taking the database write lock up front."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def get_many(self, ns, texts):
+        """Cached vectors (or None) for each text, refreshing last use of hits."""
+        keys = [text_key(t) for t in texts]
+        out = [None] * len(texts)
+        with self._lock, self._write():
+            found = {}
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                q = f"SELECT key, dim, slot FROM entries WHERE ns = ? AND key IN ({','.join('?' * len(chunk))})"
+                for key, dim, slot in self._db.execute(q, (ns, *chunk)):
+                    found[key] = (dim, slot)
+            for i, key in enumerate(keys):
+                if key in found:
+                    dim, slot = found[key]
+                    # Another process may have grown the slab since it was mapped here
+                    out[i] = np.array(self._slab(dim, slot + 1)[slot])
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE entries SET last_used = ? WHERE ns = ? AND key = ?",
+                                     [(now, ns, k) for k in found])
+            self.hits += sum(v is not None for v in out)
+            self.misses += sum(v is None for v in out)
+        return out
+
+    def put_many(self, ns, texts, vectors):
+        """Store vectors for texts, evicting least recently used entries past max_entries."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return
+        dim = vectors.shape[1]
+        now = time.time()
+        unique = {text_key(t): v for t, v in zip(texts, vectors)}
+        with self._lock, self._write():
+            rows = []
+            for key, vec in unique.items():
+                hit = self._db.execute("SELECT slot FROM entries WHERE ns = ? AND key = ? AND dim = ?",
+                                       (ns, key, dim)).fetchone()
+                slot = hit[0] if hit else self._alloc(dim)
+                self._slab(dim, slot + 1)[slot] = vec
+                rows.append((ns, key, dim, slot, now))
+            self._db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+            self._slabs[dim].flush()
+            self._evict()
+
+    def _alloc(self, dim):
+        row = self._db.execute("SELECT rowid, slot FROM free_slots WHERE dim = ? LIMIT 1", (dim,)).fetchone()
+        if row:
+            self._db.execute("DELETE FROM free_slots WHERE rowid = ?", (row[0],))
+            return row[1]
+        nxt = self._db.execute("SELECT next_slot FROM slabs WHERE dim = ?", (dim,)).fetchone()
+        slot = nxt[0] if nxt else 0
+        self._db.execute("INSERT OR REPLACE INTO slabs VALUES (?, ?)", (dim, slot + 1))
+        return slot
+
+    def _evict(self):
+        over = len(self) - self.max_entries
+        if over <= 0:
+            return
+        victims = self._db.execute(
+            "SELECT ns, key, dim, slot FROM entries ORDER BY last_used LIMIT ?", (over,)
+        ).fetchall()
+        self._db.executemany("DELETE FROM entries WHERE ns = ? AND key = ?", [(n, k) for n, k, _, _ in victims])
+        self._db.executemany("INSERT INTO free_slots VALUES (?, ?)", [(d, s) for _, _, d, s in victims])
+        self.evictions += len(victims)
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+            "evictions": self.evictions,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings backend that consults an EmbeddingCache before calling `backend`."""
+
+    def __init__(self, backend, cache, model):
+        self.backend = backend
+        self.cache = cache
+        self.model = model
+
+    def embed_documents(self, texts):
+        ns = f"{self.model}|document"
+        vectors = self.cache.get_many(ns, texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            fresh = self.backend.embed_documents(missing)
+            self.cache.put_many(ns, missing, fresh)
+            fresh = dict(zip(missing, fresh))
+            vectors = [np.asarray(fresh[t], dtype=np.float32) if v is None else v for t, v in zip(texts, vectors)]
+        return [v.tolist() for v in vectors]
+
+    def embed_query(self, text):
+        ns = f"{self.model}|query"
+        vec = self.cache.get_many(ns, [text])[0]
+        if vec is None:
+            vec = self.backend.embed_query(text)
+            self.cache.put_many(ns, [text], [vec])
+            return list(vec)
+        return vec.tolist()
+
+    def stats(self):
+        return self.cache.stats()
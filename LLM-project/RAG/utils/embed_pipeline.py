@@ -0,0 +1,149 @@
+"""
+Batched, concurrent embedding stage for index builds.
+
+Any backend with a LangChain-style ``embed_documents(texts)`` works
+(GoogleGenerativeAIEmbeddings in production, HashingEmbeddings offline).
+Requests are issued in batches by a bounded thread pool, paced by a
+token bucket, retried with exponential backoff and full jitter, and
+every finished batch is appended to a checkpoint file so a crashed
+build resumes without re-embedding what it already paid for. Local
+backends (``backend.local``) skip all of that and embed in one call.
+"""
+import os
+import random
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from config import EMBED_BATCH_SIZE, EMBED_MAX_IN_FLIGHT, EMBED_RPS, EMBED_MAX_RETRIES
+
+CHECKPOINT_MAGIC = b"EMBCKPT1"
+KEY_BYTES = 40  # sha1 hex digest
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` acquisitions per second with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                wait = (n - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingCheckpoint:
+    """Append-only file of (key, float32 vector) records with a fixed record size."""
+
+    def __init__(self, path):
+        self.path = path
+        self.dim = None
+        self._lock = threading.Lock()
+
+    def _dtype(self, dim):
+        return np.dtype([("key", f"S{KEY_BYTES}"), ("vec", "<f4", (dim,))])
+
+    def load(self):
+        """All complete records as {key: vector}; a torn final record is ignored."""
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(16)
+                if len(header) < 16 or header[:8] != CHECKPOINT_MAGIC:
+                    return {}
+                self.dim = struct.unpack("<I", header[8:12])[0]
+                dtype = self._dtype(self.dim)
+                raw = f.read()
+        except OSError:
+            return {}
+        n = len(raw) // dtype.itemsize
+        rows = np.frombuffer(raw[:n * dtype.itemsize], dtype=dtype)
+        return {k.decode("ascii"): v for k, v in zip(rows["key"], rows["vec"])}
+
+    def append(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype="<f4")
+        with self._lock:
+            if self.dim is not None and self.dim != vectors.shape[1]:
+                self.clear()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.path, "wb") as f:
+                    f.write(CHECKPOINT_MAGIC + struct.pack("<I", self.dim) + b"\0" * 4)
+            rows = np.empty(len(keys), dtype=self._dtype(self.dim))
+            rows["key"] = [k.encode("ascii") for k in keys]
+            rows["vec"] = vectors
+            with open(self.path, "ab") as f:
+                f.write(rows.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self):
+        self.dim = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class EmbeddingPipeline:
+    """Embed (key, text) pairs through a backend with batching, concurrency, pacing and retries."""
+
+    def __init__(self, backend, batch_size=EMBED_BATCH_SIZE, max_in_flight=EMBED_MAX_IN_FLIGHT,
+                 requests_per_sec=EMBED_RPS, max_retries=EMBED_MAX_RETRIES, base_delay=1.0,
+                 checkpoint_path=None):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.bucket = TokenBucket(requests_per_sec)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.checkpoint = EmbeddingCheckpoint(checkpoint_path) if checkpoint_path else None
+
+    def _call(self, texts):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                return self.backend.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0, self.base_delay * 2 ** attempt)
+                print(f"Embedding batch failed ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _run(self, batch):
+        keys = [k for k, _ in batch]
+        vectors = self._call([t for _, t in batch])
+        if self.checkpoint:
+            self.checkpoint.append(keys, vectors)
+        return keys, vectors
+
+    def embed(self, keys, texts):
+        """Vectors for texts as {key: vector}; keys should change whenever text or model does."""
+        if getattr(self.backend, "local", False):
+            # Nothing to pace, retry or resume: one vectorized call
+            return dict(zip(keys, self.backend.embed_array(texts)))
+        done = self.checkpoint.load() if self.checkpoint else {}
+        todo = [(k, t) for k, t in zip(keys, texts) if k not in done]
+        batches = [todo[i:i + self.batch_size] for i in range(0, len(todo), self.batch_size)]
+        if done:
+            print(f"Embedding: resumed {len(done)} vectors from checkpoint, {len(todo)} to go")
+
+        # Each worker checkpoints its own batch, so finished work survives a failure elsewhere
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            for fut in as_completed([pool.submit(self._run, b) for b in batches]):
+                batch_keys, vectors = fut.result()
+                done.update(zip(batch_keys, vectors))
+        return {k: done[k] for k in keys}
@@ -0,0 +1,158 @@
+"""
+City/region gazetteer derived from the geocoded POIs in the flattened datasets.
+
+Built at ingest time (``python -m utils.gazetteer``), or by the app on
+first start when the file is missing, and written to GAZETTEER_PATH,
+where both the Streamlit app and the place_finder_mcp service read it to
+resolve place names without a geocoding call.
+"""
+import json
+import os
+import sys
+from collections import Counter
+import numpy as np
+from config import DATA_PATH, GAZETTEER_PATH
+from utils.geo_utils import build_coord_array
+from utils.text_utils import INPUT_ALIASES, _lower_ascii, field_text
+
+
+def fold_name(name: str) -> str:
+    """Lookup key for a place name: lowercase, ASCII-folded, single-spaced."""
+    return " ".join(_lower_ascii(name).split())
+
+
+def region_slug(uri):
+    """'http://data.visitsweden.com/region/gavleborg' -> 'gavleborg'; None for non-region URIs."""
+    if not isinstance(uri, str) or "/region/" not in uri:
+        return None
+    return uri.rstrip("/").rsplit("/", 1)[-1]
+
+
+def _entry(name, kind, coords, **extra):
+    return {
+        "name": name,
+        "kind": kind,
+        "lat": round(float(np.median(coords[:, 0])), 6),
+        "lon": round(float(np.median(coords[:, 1])), 6),
+        "bbox": [round(float(x), 6) for x in (*coords.min(axis=0), *coords.max(axis=0))],
+        "count": int(len(coords)),
+        **extra,
+    }
+
+
+def build_gazetteer(records) -> dict:
+    """Centroid (median), bounding box and POI count per city and region."""
+    coords = build_coord_array(records)
+    ok = ~np.isnan(coords).any(axis=1)
+    city_rows, region_rows, city_names, city_regions = {}, {}, {}, {}
+
+    for i, r in enumerate(records):
+        if not ok[i]:
+            continue
+        key = None
+        city = field_text(r.get("city"))
+        if isinstance(city, str) and city.strip():
+            key = fold_name(city)
+            city_rows.setdefault(key, []).append(i)
+            city_names.setdefault(key, Counter())[city.strip()] += 1
+            city_regions.setdefault(key, Counter())
+        slug = region_slug(r.get("region"))
+        if slug:
+            region_rows.setdefault(slug, []).append(i)
+            if key in city_regions:
+                city_regions[key][slug] += 1
+
+    places = {}
+    for slug, rows in region_rows.items():
+        places[fold_name(slug)] = _entry(slug.replace("-", " ").title(), "region", coords[rows], slug=slug)
+    # Cities win over a region of the same name (e.g. Uppsala the city, not the county)
+    for key, rows in city_rows.items():
+        region = next(iter(city_regions[key].most_common(1)), (None,))[0]
+        places[key] = _entry(city_names[key].most_common(1)[0][0], "city", coords[rows], region=region)
+
+    # INPUT_ALIASES maps English spellings to Swedish ones; the data uses both,
+    # so point whichever spelling is missing at the one that exists
+    aliases = {}
+    for alias, target in INPUT_ALIASES.items():
+        a, t = fold_name(alias), fold_name(target)
+        if a == t:
+            continue
+        if t in places:
+            aliases[a] = t
+        elif a in places:
+            aliases[t] = a
+    return {"places": places, "aliases": aliases}
+
+
+class Gazetteer:
+    """Resolve place names to {"name", "kind", "lat", "lon", "bbox", ...} entries."""
+
+    def __init__(self, data: dict):
+        self.places = data.get("places", {})
+        self.aliases = data.get("aliases", {})
+
+    @classmethod
+    def from_records(cls, records):
+        return cls(build_gazetteer(records))
+
+    @classmethod
+    def load(cls, path=None):
+        with open(path or GAZETTEER_PATH, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def save(self, path=None):
+        path = path or GAZETTEER_PATH
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"places": self.places, "aliases": self.aliases}, f, ensure_ascii=False)
+        # Readers in other processes never see a half-written file
+        os.replace(tmp, path)
+
+    def __len__(self):
+        return len(self.places)
+
+    def resolve(self, name):
+        """Entry for name, or None.
+
+        Only the most specific comma part is tried ("Gamla Stan" in
+        "Gamla Stan, Stockholm"), so a district never silently resolves to
+        its city's centroid; such misses go to the geocoder instead.
+        """
+        if not name:
+            return None
+        key = fold_name(name)
+        if key not in self.places:
+            key = fold_name(name.split(",")[0])
+        key = self.aliases.get(key, key)
+        return self.places.get(key)
+
+
+def load_gazetteer(dataset=None, path=None):
+    """Load the ingest-time gazetteer, or build one from the dataset and save it if it is missing."""
+    try:
+        return Gazetteer.load(path)
+    except (OSError, ValueError):
+        gaz = Gazetteer.from_records(dataset or [])
+    if len(gaz):
+        try:
+            gaz.save(path)
+            print(f"Wrote {len(gaz)} places to {path or GAZETTEER_PATH}")
+        except OSError as e:
+            print(f"Could not save gazetteer: {e}")
+    return gaz
+
+
+def main(paths):
+    """Build GAZETTEER_PATH from DATA_PATH plus any extra flattened JSON files."""
+    records = []
+    for path in [DATA_PATH, *paths]:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        records.extend(data if isinstance(data, list) else [])
+    gaz = Gazetteer.from_records(records)
+    gaz.save()
+    print(f"Wrote {len(gaz)} places from {len(records)} records to {GAZETTEER_PATH}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,4 +1,9 @@
 import math
+from collections import ChainMap
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+MAX_NEARBY = 8
 
 def haversine(lat1, lon1, lat2, lon2):
     R = 6371
@@ -7,17 +12,109 @@ def haversine(lat1, lon1, lat2, lon2):
     a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
-def find_nearby_places(dataset, base_lat, base_lon, max_distance_km):
-    results = []
-    for rec in dataset:
-        lat, lon = rec.get("latitude"), rec.get("longitude")
-        if lat and lon:
-            try:
-                dist = haversine(float(base_lat), float(base_lon), float(lat), float(lon))
-                if dist <= max_distance_km:
-                    rec["distance_km"] = round(dist, 1)
-                    results.append(rec)
-            except Exception:
-                pass
-    results.sort(key=lambda x: x.get("distance_km", 999))
-    return results[:8]
+def _to_float(v):
+    """Parse a lat/lon value that may be a string, number or None."""
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+def build_coord_array(dataset):
+    """Return an (N, 2) float64 array of [lat, lon] in degrees, NaN where missing."""
+    coords = np.full((len(dataset), 2), np.nan, dtype=np.float64)
+    for i, rec in enumerate(dataset):
+        coords[i, 0] = _to_float(rec.get("latitude"))
+        coords[i, 1] = _to_float(rec.get("longitude"))
+    return coords
+
+def get_coords(dataset):
+    """Use the coordinate array precomputed by load_dataset, or build one."""
+    coords = getattr(dataset, "coords", None)
+    return coords if coords is not None else build_coord_array(dataset)
+
+def haversine_np(lat, lon, lats, lons):
+    """Vectorized haversine from one point (degrees) to arrays of points (degrees)."""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def haversine_matrix(lats1, lons1, lats2, lons2):
+    """Pairwise haversine (km) between M and B points (degrees) as an (M, B) array."""
+    lat1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(lons1, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(lats2, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(lons2, dtype=np.float64))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def nearest_matrix(origins, dataset, k, place_type=None, block_size=4096):
+    """k nearest POIs for each of M origins, scanning POIs in blocks.
+
+    origins is a sequence of (lat, lon). Returns (distances_km, rows), both
+    (M, K) with K = min(k, candidate POIs), sorted by distance per origin;
+    rows index the dataset. Memory stays at M x (block_size + k) floats.
+    """
+    origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+    coords = get_coords(dataset)
+    rows = get_spatial_index(dataset).partition(place_type).rows
+    k = min(k, len(rows))
+    m = len(origins)
+    best_dist = np.empty((m, 0))
+    best_rows = np.empty((m, 0), dtype=np.intp)
+    if k <= 0:
+        return best_dist, best_rows
+
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        dist = haversine_matrix(origins[:, 0], origins[:, 1], coords[block, 0], coords[block, 1])
+        cand_dist = np.concatenate((best_dist, dist), axis=1)
+        cand_rows = np.concatenate((best_rows, np.broadcast_to(block, dist.shape)), axis=1)
+        if cand_dist.shape[1] > k:
+            keep = np.argpartition(cand_dist, k - 1, axis=1)[:, :k]
+            cand_dist = np.take_along_axis(cand_dist, keep, axis=1)
+            cand_rows = np.take_along_axis(cand_rows, keep, axis=1)
+        best_dist, best_rows = cand_dist, cand_rows
+
+    order = np.argsort(best_dist, axis=1, kind="stable")
+    return np.take_along_axis(best_dist, order, axis=1), np.take_along_axis(best_rows, order, axis=1)
+
+def top_k_smallest(values, k):
+    """Indices of the k smallest values, sorted ascending (argpartition + small sort)."""
+    if k <= 0 or values.size == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < values.size:
+        idx = np.argpartition(values, k - 1)[:k]
+    else:
+        idx = np.arange(values.size)
+    return idx[np.argsort(values[idx], kind="stable")]
+
+def place_view(rec, dist):
+    """Read-only-to-the-record view that adds distance_km without mutating rec."""
+    return ChainMap({"distance_km": round(float(dist), 1)}, rec)
+
+def get_spatial_index(dataset):
+    """Use the spatial index built by load_dataset, or build one over the dataset."""
+    index = getattr(dataset, "spatial", None)
+    if index is None:
+        from utils.spatial_index import PartitionedIndex
+        index = PartitionedIndex(get_coords(dataset), [rec.get("type") for rec in dataset])
+    return index
+
+def find_nearby_places(dataset, base_lat, base_lon, radius_km, limit=MAX_NEARBY, place_type=None, max_radius_km=None):
+    """Closest records within radius_km, optionally only of one `type`.
+
+    With max_radius_km, the search radius doubles from radius_km until
+    `limit` records are found, but nothing farther than max_radius_km is
+    ever returned.
+    """
+    try:
+        base_lat, base_lon = float(base_lat), float(base_lon)
+    except (TypeError, ValueError):
+        return []
+    index = get_spatial_index(dataset)
+    if max_radius_km is not None and max_radius_km > radius_km:
+        rows, dist = index.expanding(base_lat, base_lon, limit, radius_km, max_radius_km, place_type=place_type)
+    else:
+        rows, dist = index.radius(base_lat, base_lon, radius_km, limit, place_type=place_type)
+    return [place_view(dataset[i], d) for i, d in zip(rows, dist)]
@@ -0,0 +1,199 @@
+"""
+In-memory BM25 index over the document text, fused with dense retrieval.
+
+Dense embeddings blur rare Swedish proper nouns ("Bysjön", "Gamla
+Uppsala"); exact term matching does not. The tokenizer applies
+normalize_geo_terms, folds diacritics, adds the parts of common Swedish
+compounds ("vasamuseet" -> "vasa" + "museet") and strips a few
+inflection suffixes, on documents and queries alike. Postings are kept
+as flat NumPy arrays (CSR layout), so a query is a handful of vector
+adds. HybridRetriever merges the dense and BM25 rankings with reciprocal
+rank fusion.
+"""
+import os
+import re
+from collections import Counter
+import numpy as np
+from config import TOP_K, HYBRID_DENSE_K, HYBRID_LEXICAL_K, RRF_K
+from utils.rag_utils import make_doc_from_record, normalize_geo_terms
+from utils.text_utils import _lower_ascii
+
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "best", "can", "do", "for", "how", "i", "in", "is", "me",
+    "near", "nearby", "of", "on", "some", "the", "there", "things", "to", "what", "where", "with",
+    "av", "de", "den", "det", "en", "ett", "for", "har", "med", "och", "om", "pa", "som", "till",
+}
+# Frequent heads of Swedish place-name compounds, ASCII-folded
+COMPOUND_HEADS = (
+    "museet", "museum", "slottet", "slott", "kyrkan", "kyrka", "torget", "torg", "gatan",
+    "parken", "park", "hamnen", "hamn", "stranden", "strand", "skogen", "skog", "berget", "berg",
+    "holmen", "holm", "viken", "vik", "sjon", "sjo", "dalen", "dal", "borg", "stad", "by",
+)
+SUFFIXES = ("arnas", "ernas", "ornas", "arna", "erna", "orna", "ande", "ende", "aste", "ast",
+            "en", "et", "ar", "er", "or", "as", "es", "s")
+_WORD = re.compile(r"[a-z0-9]+")
+_LABEL = re.compile(r"^\w+: ", re.MULTILINE)
+_NAME = re.compile(r"^name: (.*)$", re.MULTILINE)
+
+
+def stem(token):
+    """Strip one inflection suffix, keeping at least three characters of stem."""
+    for suf in SUFFIXES:
+        if token.endswith(suf) and len(token) - len(suf) >= 3:
+            return token[:-len(suf)]
+    return token
+
+
+def split_compound(token):
+    """(modifier, head) for a known compound head, else None."""
+    for head in COMPOUND_HEADS:
+        if token.endswith(head) and len(token) - len(head) >= 3:
+            return token[:-len(head)], head
+    return None
+
+
+def tokenize(text):
+    """Index terms for text: folded, stop words dropped, compounds split, lightly stemmed."""
+    text = _lower_ascii(normalize_geo_terms(text.lower()))
+    terms = []
+    for tok in _WORD.findall(text):
+        if tok in STOPWORDS:
+            continue
+        terms.append(stem(tok))
+        parts = split_compound(tok)
+        if parts:
+            terms.extend(stem(p) for p in parts)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed document collection."""
+
+    def __init__(self, ids, texts, k1=1.2, b=0.75):
+        self.ids = list(ids)
+        self.k1, self.b = k1, b
+        vocab, postings = {}, []
+        lengths = np.zeros(len(self.ids), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[row] = sum(counts.values())
+            for term, tf in counts.items():
+                if term not in vocab:
+                    vocab[term] = len(vocab)
+                    postings.append([])
+                postings[vocab[term]].append((row, tf))
+        self.vocab = vocab
+        self.offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in postings], out=self.offsets[1:])
+        self.rows = np.array([r for p in postings for r, _ in p], dtype=np.int32)
+        tf = np.array([t for p in postings for _, t in p], dtype=np.float32)
+        avg = lengths.mean() if len(lengths) else 1.0
+        df = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log(1 + (len(self.ids) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Precompute the tf/length part of every posting so queries only add
+        norm = tf + k1 * (1 - b + b * lengths[self.rows] / max(avg, 1e-9))
+        self.weights = (tf * (k1 + 1) / norm).astype(np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k=TOP_K, allowed_rows=None):
+        """[(poi_id, score)] of the best k matches, optionally restricted to allowed_rows."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            s, e = self.offsets[t], self.offsets[t + 1]
+            scores[self.rows[s:e]] += self.idf[t] * self.weights[s:e]
+        if allowed_rows is not None:
+            mask = np.zeros(len(self.ids), dtype=bool)
+            mask[allowed_rows] = True
+            scores[~mask] = 0
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        k = min(k, len(hits))
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    def memory_usage(self):
+        return self.offsets.nbytes + self.rows.nbytes + self.weights.nbytes + self.idf.nbytes
+
+    def save(self, path):
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp, ids=np.array(self.ids, dtype=str), terms=np.array(list(self.vocab), dtype=str),
+            offsets=self.offsets, rows=self.rows, weights=self.weights, idf=self.idf,
+            params=np.array([self.k1, self.b], dtype=np.float64),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Index saved with ``save``; nothing is re-tokenized."""
+        index = cls.__new__(cls)
+        with np.load(path) as z:
+            index.ids = z["ids"].tolist()
+            index.vocab = {t: i for i, t in enumerate(z["terms"].tolist())}
+            index.offsets, index.rows, index.weights, index.idf = z["offsets"], z["rows"], z["weights"], z["idf"]
+            index.k1, index.b = (float(x) for x in z["params"])
+        return index
+
+
+def lexical_text(page_content):
+    """Indexed text for a document: field labels dropped, name counted twice."""
+    name = _NAME.search(page_content)
+    body = _LABEL.sub("", page_content)
+    return f"{name.group(1)}\n{body}" if name else body
+
+
+def build_lexical_index(dataset):
+    """BM25 over the same text the embeddings see."""
+    texts = [lexical_text(make_doc_from_record(r, pid).page_content) for r, pid in zip(dataset, dataset.ids)]
+    return BM25Index(dataset.ids, texts)
+
+
+def rrf_fuse(rankings, k=RRF_K):
+    """Reciprocal rank fusion of several ranked id lists; best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, pid in enumerate(ranking):
+            scores[pid] = scores.get(pid, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever:
+    """Dense + BM25 retrieval fused with RRF, behind the usual ``similarity_search``.
+
+    The lexical index must be built over `dataset` (same row order), so
+    metadata filters resolve to rows through the dataset's posting lists.
+    """
+
+    def __init__(self, dense, lexical, dataset, dense_k=HYBRID_DENSE_K, lexical_k=HYBRID_LEXICAL_K):
+        self.dense = dense
+        self.lexical = lexical
+        self.dataset = dataset
+        self.dense_k = dense_k
+        self.lexical_k = lexical_k
+
+    def similarity_search(self, query, k=TOP_K, filter=None):
+        """Top-k fused documents; filters the posting lists cannot answer leave BM25 out."""
+        # Never ask either side for fewer than k, or a thin lexical list leaves the result short
+        dense_docs = self.dense.similarity_search(query, k=max(self.dense_k, k), filter=filter)
+        by_id = {d.metadata.get("poi_id"): d for d in dense_docs}
+        allowed = self.dataset.rows_where(filter) if filter else None
+        lexical = []
+        if not filter or allowed is not None:
+            lexical = [pid for pid, _ in self.lexical.search(query, max(self.lexical_k, k), allowed)]
+
+        docs = []
+        for pid in rrf_fuse([list(by_id), lexical])[:k]:
+            if pid in by_id:
+                docs.append(by_id[pid])
+            else:
+                rec = self.dataset.by_id(pid)
+                if rec is not None:
+                    docs.append(make_doc_from_record(rec, pid))
+        return docs
@@ -0,0 +1,186 @@
+"""
+Deterministic local embeddings: hashed character n-gram TF-IDF.
+
+Selected with EMBED_MODEL = "local:hash-<dim>" (e.g. "local:hash-768"),
+so index builds, retrieval benchmarks and CI run offline without an API
+key. Text is folded to lowercase ASCII words, every character n-gram
+(3 to 5 by default, word boundaries included) is hashed into one of dim
+signed buckets, term counts are damped (1 + log tf), weighted by an IDF
+table and L2-normalized.
+
+Hashing is a vectorized polynomial rolling hash over the bytes of a
+whole batch at once (with a 64-bit finalizer), so no Python loop runs
+per n-gram and the result never depends on PYTHONHASHSEED. Large batches
+are split across processes. The IDF table is fitted once on the dataset
+documents and frozen in LOCAL_EMBED_IDF_PATH; delete it (and rebuild the
+index) to refit.
+"""
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_PRIME = np.uint64(0x100000001B3)
+_MIX1 = np.uint64(0xFF51AFD7ED558CCD)
+_MIX2 = np.uint64(0xC4CEB9FE1A85EC53)
+
+
+def fold(text):
+    """Lowercase ASCII words separated by single spaces, padded with one space on each side."""
+    text = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    return f" {_NON_WORD.sub(' ', text).strip()} "
+
+
+def _mix(h):
+    h ^= h >> np.uint64(33)
+    h *= _MIX1
+    h ^= h >> np.uint64(33)
+    h *= _MIX2
+    h ^= h >> np.uint64(33)
+    return h
+
+
+def hashed_counts(texts, dim, ngram_range=(3, 5)):
+    """Signed hashed n-gram counts, shape (len(texts), dim)."""
+    folded = [fold(t).encode("ascii") for t in texts]
+    lengths = np.array([len(b) for b in folded], dtype=np.int64)
+    data = np.frombuffer(b"".join(folded), dtype=np.uint8).astype(np.uint64)
+    doc = np.repeat(np.arange(len(folded)), lengths)
+    counts = np.zeros(len(folded) * dim, dtype=np.float64)
+    with np.errstate(over="ignore"):
+        for n in range(ngram_range[0], ngram_range[1] + 1):
+            m = len(data) - n + 1
+            if m <= 0:
+                continue
+            h = np.full(m, n, dtype=np.uint64)
+            for j in range(n):
+                h = h * _PRIME + data[j:j + m]
+            h = _mix(h)
+            # Keep only n-grams that start and end inside the same document
+            same = doc[:m] == doc[n - 1:]
+            h, rows = h[same], doc[:m][same]
+            sign = 1.0 - 2.0 * (h >> np.uint64(63)).astype(np.float64)
+            counts += np.bincount(rows * dim + (h % np.uint64(dim)).astype(np.int64), weights=sign,
+                                  minlength=len(counts))
+    return counts.reshape(len(folded), dim)
+
+
+def _embed_chunk(args):
+    texts, dim, ngram_range, idf = args
+    counts = hashed_counts(texts, dim, ngram_range)
+    x = np.sign(counts) * np.log1p(np.abs(counts))
+    if idf is not None:
+        x *= idf
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return (x / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+class HashingEmbeddings(Embeddings):
+    """LangChain embeddings backend computing hashed char n-gram TF-IDF vectors locally."""
+
+    # No network behind it: EmbeddingPipeline skips pacing and checkpoints
+    local = True
+
+    def __init__(self, dim=768, ngram_range=(3, 5), idf=None, chunk_size=2048, workers=None):
+        self.dim = dim
+        self.ngram_range = tuple(ngram_range)
+        self.idf = idf
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+
+    @classmethod
+    def from_model(cls, model, **kwargs):
+        """Backend for an EMBED_MODEL string such as "local:hash-768"."""
+        m = re.fullmatch(r"local:hash-(\d+)", model)
+        if not m:
+            raise ValueError(f"Unknown local embedding model: {model}")
+        return cls(dim=int(m.group(1)), **kwargs)
+
+    def fit(self, texts):
+        """Fit the IDF table on a corpus: smoothed log(N / df) per bucket."""
+        df = np.zeros(self.dim, dtype=np.int64)
+        for i in range(0, len(texts), self.chunk_size):
+            df += (hashed_counts(texts[i:i + self.chunk_size], self.dim, self.ngram_range) != 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float64)
+        return self
+
+    def save_idf(self, path):
+        tmp = path + ".tmp.npy"
+        np.save(tmp, np.concatenate([[self.dim, *self.ngram_range], self.idf]))
+        os.replace(tmp, path)
+
+    def load_idf(self, path):
+        """Load a saved IDF table; False if it is missing or was fitted for another dim/n-gram range."""
+        try:
+            saved = np.load(path)
+        except (OSError, ValueError):
+            return False
+        if tuple(saved[:3].astype(int)) != (self.dim, *self.ngram_range):
+            return False
+        self.idf = saved[3:]
+        return True
+
+    def embed_array(self, texts):
+        """Vectors for texts as one float32 array, batched over worker processes for large inputs."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        chunks = [(texts[i:i + self.chunk_size], self.dim, self.ngram_range, self.idf)
+                  for i in range(0, len(texts), self.chunk_size)]
+        if len(chunks) == 1 or self.workers == 1:
+            return np.vstack([_embed_chunk(c) for c in chunks])
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(chunks))) as pool:
+            return np.vstack(list(pool.map(_embed_chunk, chunks)))
+
+    def embed_documents(self, texts):
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text):
+        return _embed_chunk(([text], self.dim, self.ngram_range, self.idf))[0].tolist()
+
+
+def local_embeddings(model, corpus, idf_path):
+    """HashingEmbeddings for model with its IDF loaded from idf_path, fitted on corpus() if needed."""
+    backend = HashingEmbeddings.from_model(model)
+    if not backend.load_idf(idf_path):
+        texts = corpus()
+        print(f"Local embeddings: fitting IDF on {len(texts)} documents")
+        backend.fit(texts).save_idf(idf_path)
+    return backend
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from utils.ann_index import IVFIndex, benchmark
+
+    parser = argparse.ArgumentParser(description="Offline build/query benchmark on synthetic documents.")
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyzåäö"))
+    words = np.array(["".join(rng.choice(letters, rng.integers(3, 10))) for _ in range(5000)])
+    picks = rng.integers(0, len(words), (args.docs, 50))
+    docs = [" ".join(words[p]) for p in picks]
+
+    emb = HashingEmbeddings(dim=args.dim)
+    start = time.perf_counter()
+    emb.fit(docs)
+    vectors = emb.embed_array(docs)
+    secs = time.perf_counter() - start
+    print(f"Embedded {len(docs)} docs in {secs:.1f}s ({len(docs) / secs:.0f} docs/s, {emb.workers} workers)")
+
+    ids = [str(i) for i in range(len(docs))]
+    start = time.perf_counter()
+    index = IVFIndex.build(ids, vectors, docs, [{} for _ in ids])
+    print(f"IVF build: {time.perf_counter() - start:.1f}s, {index.nlist} lists")
+
+    queries = np.array([emb.embed_query(docs[i][:60]) for i in rng.choice(len(docs), args.queries)], dtype=np.float32)
+    for row in benchmark(index, queries):
+        print(row)
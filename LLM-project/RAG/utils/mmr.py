@@ -0,0 +1,70 @@
+"""
+Maximal marginal relevance reranking over the stored document vectors.
+
+Near-duplicate records (one restaurant under two categories, several
+entries for one museum) embed almost identically, so TOP_K plain hits
+can spend the prompt on the same place twice. MMR over-fetches
+MMR_FETCH_K candidates and greedily picks the one maximising
+
+    lambda * sim(query, doc) - (1 - lambda) * max sim(doc, picked)
+
+The document vectors are read back from the index (no re-embedding) and
+the selection is a few NumPy ops on a fetch_k x fetch_k matrix.
+"""
+import numpy as np
+from config import TOP_K, MMR_FETCH_K, MMR_LAMBDA
+
+
+def _normalize(x):
+    n = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.where(n == 0, 1, n)
+
+
+def mmr_select(query, vectors, k=TOP_K, lambda_mult=MMR_LAMBDA):
+    """Indices of the k rows of vectors chosen by MMR against query, in pick order."""
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    n = len(vectors)
+    if n <= k:
+        return list(range(n))
+    relevance = vectors @ _normalize(np.asarray(query, dtype=np.float32))
+    pairwise = vectors @ vectors.T
+    picked = np.zeros(n, dtype=bool)
+    i = int(np.argmax(relevance))
+    order = [i]
+    picked[i] = True
+    redundancy = pairwise[i].copy()
+    for _ in range(k - 1):
+        score = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        score[picked] = -np.inf
+        i = int(np.argmax(score))
+        order.append(i)
+        picked[i] = True
+        np.maximum(redundancy, pairwise[i], out=redundancy)
+    return order
+
+
+class MMRRetriever:
+    """Reranks another retriever's results for diversity, behind the usual ``similarity_search``.
+
+    vectors: a CachedRetriever (or anything with ``embed_query`` and
+    ``vectors(ids)``) over the index the documents came from.
+    """
+
+    def __init__(self, retriever, vectors, fetch_k=MMR_FETCH_K, lambda_mult=MMR_LAMBDA):
+        self.retriever = retriever
+        self.vectors = vectors
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+
+    def similarity_search(self, query, k=TOP_K, filter=None):
+        """k documents from fetch_k candidates, relevant but not redundant."""
+        docs = self.retriever.similarity_search(query, k=max(k, self.fetch_k), filter=filter)
+        if len(docs) <= k:
+            return docs
+        ids = [d.metadata.get("poi_id") for d in docs]
+        found = self.vectors.vectors([i for i in ids if i])
+        query_vec = self.vectors.embed_query(query)
+        # A candidate without a stored vector keeps relevance 0 and never looks redundant
+        dim = len(query_vec)
+        matrix = np.array([found.get(i, np.zeros(dim)) for i in ids], dtype=np.float32)
+        return [docs[i] for i in mmr_select(query_vec, matrix, k, self.lambda_mult)]
@@ -0,0 +1,305 @@
+"""
+Columnar in-memory store for the flattened POI dataset.
+
+Replaces the raw list of ~25-key dicts (mostly None, with repeated URIs
+and "schema:..." strings) by:
+- a float64 [lat, lon] array,
+- interned categorical columns (int32 codes + one copy of each value),
+- sparse text columns: the rows that have a value, plus their UTF-8
+  bytes packed into one blob with an offsets array,
+- a sparse side table for the few non-text values (opening hours, ratings).
+
+Rows are read through POIRecord views, which behave like the old dicts
+(``rec.get("city")``, ``rec["name"]``, ``dict(rec)``) without copying.
+
+City, region and type are also filterable: each normalized value
+(folded city name, region slug, schema type) has a sorted posting list
+of rows, so metadata filters resolve to row sets without a scan.
+"""
+import hashlib
+import sys
+from collections.abc import Mapping, Sequence
+import numpy as np
+from utils.gazetteer import fold_name, region_slug
+from utils.geo_utils import build_coord_array
+from utils.spatial_index import PartitionedIndex
+from utils.text_utils import field_text
+
+CATEGORICAL_FIELDS = ("type", "additional_type", "region", "city", "country")
+COORD_FIELDS = ("latitude", "longitude")
+FILTER_FIELDS = ("city", "region", "type")
+
+
+def record_ids(records):
+    """Stable ids from type, name, coordinates and url; repeats get a #n suffix."""
+    ids, seen = [], {}
+    for r in records:
+        key = "|".join(str(r.get(f) or "") for f in ("type", "name", "latitude", "longitude", "url"))
+        base = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        ids.append(base if n == 0 else f"{base}#{n}")
+    return ids
+
+
+def _clean(v):
+    """Flatten JSON-LD {"@value": ...} dicts and turn empty values into None."""
+    v = field_text(v)
+    if isinstance(v, str):
+        v = v.strip()
+    return None if v in ("", [], {}) else v
+
+
+def filter_value(field, v):
+    """Normalized, filterable form of a city/region/type value; None if absent."""
+    v = _clean(v)
+    if not isinstance(v, str):
+        return None
+    if field == "city":
+        return fold_name(v)
+    if field == "region":
+        return region_slug(v)
+    return v
+
+
+def _as_rows(rows):
+    return np.unique(np.asarray(rows, dtype=np.int64))
+
+
+def filter_rows(flt, postings, row_by_id):
+    """Sorted rows matching a Chroma-style where filter, from posting lists.
+
+    Supports field equality, $eq and $in on FILTER_FIELDS and poi_id, plus
+    $and / $or. Returns None for anything else so callers can fall back.
+    """
+    sets = []
+    for key, cond in flt.items():
+        if key in ("$and", "$or"):
+            parts = [filter_rows(f, postings, row_by_id) for f in cond]
+            if any(p is None for p in parts):
+                return None
+            if not parts:
+                continue
+            acc = parts[0]
+            for p in parts[1:]:
+                acc = np.intersect1d(acc, p) if key == "$and" else np.union1d(acc, p)
+            sets.append(acc)
+            continue
+        if isinstance(cond, dict):
+            if set(cond) == {"$eq"}:
+                values = [cond["$eq"]]
+            elif set(cond) == {"$in"}:
+                values = list(cond["$in"])
+            else:
+                return None
+        else:
+            values = [cond]
+        if key == "poi_id":
+            sets.append(_as_rows([r for r in map(row_by_id.get, values) if r is not None]))
+        elif key in postings:
+            lists = [postings[key].get(v) for v in values]
+            lists = [l for l in lists if l is not None]
+            sets.append(_as_rows(np.concatenate(lists)) if lists else _as_rows([]))
+        else:
+            return None
+    if not sets:
+        return None
+    acc = sets[0]
+    for rows in sets[1:]:
+        acc = np.intersect1d(acc, rows)
+    return acc
+
+
+class _TextColumn:
+    """Sparse string column: sorted row numbers, offsets and one UTF-8 blob."""
+
+    __slots__ = ("rows", "offsets", "blob")
+
+    def __init__(self, items):
+        encoded = [v.encode("utf-8") for _, v in items]
+        self.rows = np.array([row for row, _ in items], dtype=np.int32)
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=self.offsets[1:])
+        self.blob = b"".join(encoded)
+
+    def get(self, row):
+        i = int(np.searchsorted(self.rows, row))
+        if i < len(self.rows) and self.rows[i] == row:
+            return self.blob[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+        return None
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes + self.offsets.nbytes + sys.getsizeof(self.blob)
+
+
+class POIRecord(Mapping):
+    """Read-only dict-like view of one row in a POIStore."""
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    @property
+    def row(self):
+        return self._row
+
+    @property
+    def id(self):
+        return self._store.ids[self._row]
+
+    def __getitem__(self, field):
+        v = self._store.value(self._row, field)
+        if v is None:
+            raise KeyError(field)
+        return v
+
+    def get(self, field, default=None):
+        v = self._store.value(self._row, field)
+        return default if v is None else v
+
+    def __iter__(self):
+        return (f for f in self._store.fields if self._store.value(self._row, f) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"POIRecord({self.id!r}, {self.get('name')!r})"
+
+
+class POIStore(Sequence):
+    """Columnar POI table; ``store[i]`` and ``store.by_id(id)`` return POIRecord views."""
+
+    def __init__(self, records=()):
+        records = list(records)
+        n = len(records)
+        self.ids = record_ids(records)
+        self._row_by_id = {pid: i for i, pid in enumerate(self.ids)}
+        self.coords = build_coord_array(records)
+
+        fields = []
+        for r in records:
+            for f in r:
+                if f not in fields:
+                    fields.append(f)
+        self.fields = tuple(fields)
+
+        self._categories = {}
+        self._codes = {}
+        for f in CATEGORICAL_FIELDS:
+            lookup, values = {}, []
+            codes = np.full(n, -1, dtype=np.int32)
+            for i, r in enumerate(records):
+                v = _clean(r.get(f))
+                if v is None:
+                    continue
+                if not isinstance(v, str):
+                    v = str(v)
+                if v not in lookup:
+                    lookup[v] = len(values)
+                    values.append(v)
+                codes[i] = lookup[v]
+            self._categories[f] = values
+            self._codes[f] = codes
+
+        columnar = set(CATEGORICAL_FIELDS) | set(COORD_FIELDS)
+        self._text = {}
+        self._objects = {}
+        for f in self.fields:
+            if f in columnar:
+                continue
+            texts, objects = [], {}
+            for i, r in enumerate(records):
+                v = _clean(r.get(f))
+                if isinstance(v, str):
+                    texts.append((i, v))
+                elif v is not None:
+                    objects[i] = v
+            if texts:
+                self._text[f] = _TextColumn(texts)
+            if objects:
+                self._objects[f] = objects
+
+        self.spatial = PartitionedIndex(self.coords, self.column("type"))
+        self._postings = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [POIRecord(self, i) for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return POIRecord(self, row)
+
+    def by_id(self, poi_id):
+        """Record view for a poi_id, or None."""
+        row = self._row_by_id.get(poi_id)
+        return None if row is None else POIRecord(self, row)
+
+    def value(self, row, field):
+        """Single cell lookup; None when the record has no value for field."""
+        if field in self._codes:
+            code = self._codes[field][row]
+            return None if code < 0 else self._categories[field][code]
+        if field in COORD_FIELDS:
+            v = self.coords[row, COORD_FIELDS.index(field)]
+            return None if np.isnan(v) else float(v)
+        col = self._text.get(field)
+        v = col.get(row) if col else None
+        if v is None and field in self._objects:
+            v = self._objects[field].get(row)
+        return v
+
+    def column(self, field):
+        """Whole column as a list (None for missing values)."""
+        if field in self._codes:
+            cats = self._categories[field]
+            return [None if c < 0 else cats[c] for c in self._codes[field]]
+        return [self.value(i, field) for i in range(len(self))]
+
+    def categories(self, field):
+        """Distinct values of a categorical column."""
+        return list(self._categories.get(field, []))
+
+    def codes(self, field):
+        """int32 category codes of a categorical column (-1 for missing)."""
+        return self._codes[field]
+
+    def postings(self):
+        """{field: {normalized value: sorted rows}} for FILTER_FIELDS, built from the codes on first use."""
+        if self._postings is None:
+            postings = {}
+            for f in FILTER_FIELDS:
+                codes = self._codes[f]
+                order = np.argsort(codes, kind="stable")
+                bounds = np.searchsorted(codes[order], np.arange(len(self._categories[f]) + 1))
+                lists = {}
+                for code, value in enumerate(self._categories[f]):
+                    key = filter_value(f, value)
+                    rows = order[bounds[code]:bounds[code + 1]]
+                    if key is not None and len(rows):
+                        lists.setdefault(key, []).append(rows)
+                postings[f] = {k: np.sort(np.concatenate(v)).astype(np.int32) for k, v in lists.items()}
+            self._postings = postings
+        return self._postings
+
+    def rows_where(self, flt):
+        """Rows matching a metadata filter (see filter_rows), or None if it cannot be evaluated."""
+        return filter_rows(flt, self.postings(), self._row_by_id) if flt else None
+
+    def memory_usage(self):
+        """Approximate bytes held by the store's columns."""
+        total = self.coords.nbytes + sum(c.nbytes for c in self._codes.values())
+        total += sum(sys.getsizeof(v) for cats in self._categories.values() for v in cats)
+        total += sum(col.nbytes for col in self._text.values())
+        for col in self._objects.values():
+            total += sys.getsizeof(col) + sum(sys.getsizeof(v) for v in col.values())
+        total += sys.getsizeof(self.ids) + sum(sys.getsizeof(v) for v in self.ids)
+        return total
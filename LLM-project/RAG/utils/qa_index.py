@@ -0,0 +1,112 @@
+"""
+Index over the curated qa.json answers.
+
+A question is matched three ways, cheapest first:
+  1. exact: its topic (the folded question without question words and
+     filler such as "what is", "swedes", "in sweden") equals a stored one;
+     a stored topic that only appears inside it ("contains") asks about
+     more than the stored answer covers;
+  2. trigram: Dice similarity of character trigrams of the topics,
+     through an inverted trigram index (catches typos and inflections);
+  3. embedding: cosine similarity against precomputed question vectors
+     (catches rephrasings).
+Exact matches and strong trigram or embedding matches are "high"
+confidence and are served as the answer directly; "contains" matches
+and weaker trigram or embedding ones are "medium" and go into the
+prompt as verified context.
+"""
+import re
+import numpy as np
+from config import QA_TRIGRAM_HIGH, QA_TRIGRAM_MEDIUM, QA_EMBED_HIGH, QA_EMBED_MEDIUM
+from utils.query_cache import canonical_query
+
+QUESTION_WORDS = {
+    "what", "whats", "what's", "is", "are", "was", "why", "how", "do", "does", "did", "the", "a", "an",
+    "about", "tell", "me", "please", "can", "you", "explain", "mean", "means", "meaning", "of", "in",
+    "sweden", "swedes", "swedish", "swede", "s",
+}
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def question_topic(q):
+    """Folded question with question words and filler removed."""
+    words = _NON_WORD.sub(" ", canonical_query(q)).split()
+    return " ".join(w for w in words if w not in QUESTION_WORDS)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class QAIndex:
+    """Exact, trigram and embedding lookup over [{"question", "answer", ...}] pairs.
+
+    embeddings: optional LangChain embeddings backend used once to embed
+    the stored questions; the query vector is passed to ``match``. Stored
+    questions go through ``embed_query`` like incoming ones, so the
+    QA_EMBED_* thresholds compare two query vectors (document embeddings
+    live in a different task space and score lower against queries).
+    """
+
+    def __init__(self, qa_pairs, embeddings=None):
+        self.pairs = [qa for qa in qa_pairs if qa.get("question") and qa.get("answer")]
+        self.topics = [question_topic(qa["question"]) for qa in self.pairs]
+        self.exact = {}
+        for i, topic in enumerate(self.topics):
+            if topic:
+                self.exact.setdefault(topic, i)
+        self._grams = [trigrams(t) for t in self.topics]
+        self.postings = {}
+        for i, grams in enumerate(self._grams):
+            for g in grams:
+                self.postings.setdefault(g, []).append(i)
+        self.vectors = None
+        if embeddings is not None and self.pairs:
+            v = np.asarray([embeddings.embed_query(qa["question"]) for qa in self.pairs], dtype=np.float32)
+            self.vectors = v / np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-12)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def _trigram_best(self, topic):
+        grams = trigrams(topic)
+        shared = {}
+        for g in grams:
+            for i in self.postings.get(g, ()):
+                shared[i] = shared.get(i, 0) + 1
+        if not shared:
+            return None, 0.0
+        scores = {i: 2 * n / (len(grams) + len(self._grams[i])) for i, n in shared.items()}
+        best = max(scores, key=scores.get)
+        return best, scores[best]
+
+    def match(self, query, query_vec=None):
+        """Best match as {"qa", "score", "method", "confidence"} ("high" or "medium"), else None."""
+        topic = question_topic(query)
+        if not topic:
+            return None
+        if topic in self.exact:
+            return {"qa": self.pairs[self.exact[topic]], "score": 1.0, "method": "exact", "confidence": "high"}
+
+        candidates = []
+        # A stored topic inside a longer question ("what is fika and where do I get it")
+        words = topic.split()
+        spans = (" ".join(words[a:b]) for a in range(len(words)) for b in range(a + 1, min(a + 4, len(words)) + 1))
+        for span in spans:
+            if span in self.exact:
+                candidates.append((False, len(span) / len(topic), self.exact[span], "contains"))
+        i, score = self._trigram_best(topic)
+        if score >= QA_TRIGRAM_MEDIUM:
+            candidates.append((score >= QA_TRIGRAM_HIGH, score, i, "trigram"))
+        if query_vec is not None and self.vectors is not None:
+            q = np.asarray(query_vec, dtype=np.float32)
+            sims = self.vectors @ (q / max(np.linalg.norm(q), 1e-12))
+            j = int(np.argmax(sims))
+            if sims[j] >= QA_EMBED_MEDIUM:
+                candidates.append((sims[j] >= QA_EMBED_HIGH, float(sims[j]), j, "embedding"))
+        if not candidates:
+            return None
+        high, score, i, method = max(candidates)
+        return {"qa": self.pairs[i], "score": round(score, 3), "method": method,
+                "confidence": "high" if high else "medium"}
@@ -0,0 +1,159 @@
+"""
+Two-level cache in front of vector retrieval.
+
+L1 maps a canonical query to its embedding, so a repeated question never
+pays the embedding round trip. L2 maps (canonical query, k, filter) to
+the ranked poi_ids the search returned; a hit reads those documents back
+from the local vector store without scoring anything. Stored document
+vectors read back for reranking are kept alongside. All levels are
+in-memory LRU with a TTL and are dropped whenever the index version
+(the Chroma sync manifest, ANN index or shard manifest) changes.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from langchain.schema import Document
+from config import EMBED_MODEL, ANN_INDEX_PATH, SHARD_DIR, TOP_K, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_S
+from utils.rag_utils import MANIFEST_PATH
+from utils.resources import file_version
+from utils.text_utils import normalize_user_query_spelling
+
+
+def canonical_query(q: str) -> str:
+    """Cache key for a query: Swedish spellings, no diacritics, lowercase, single spaces."""
+    q = normalize_user_query_spelling(q)
+    q = "".join(c for c in unicodedata.normalize("NFKD", q) if not unicodedata.combining(c))
+    return " ".join(q.lower().split()).rstrip("?!. ")
+
+
+class LRUCache:
+    """Thread-safe LRU map whose entries also expire ttl seconds after insertion."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or time.monotonic() - item[1] > self.ttl:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+        }
+
+
+class CachedRetriever:
+    """Drop-in for ``vectordb.similarity_search`` backed by the two cache levels.
+
+    version: zero-arg callable returning the index version; defaults to the
+    embedding model plus the (mtime, size) of the sync manifest, ANN index
+    and shard manifest.
+    """
+
+    def __init__(self, vectordb, version=None, max_entries=QUERY_CACHE_MAX_ENTRIES, ttl=QUERY_CACHE_TTL_S):
+        self.vectordb = vectordb
+        self._version = version or (lambda: (
+            EMBED_MODEL, file_version(MANIFEST_PATH, ANN_INDEX_PATH, os.path.join(SHARD_DIR, "manifest.json"))
+        ))
+        self._seen_version = None
+        self.embeddings = LRUCache(max_entries, ttl)
+        self.results = LRUCache(max_entries, ttl)
+        self.doc_vectors = LRUCache(max_entries * TOP_K, ttl)
+
+    def _check_version(self):
+        v = self._version()
+        if v != self._seen_version:
+            self.embeddings.clear()
+            self.results.clear()
+            self.doc_vectors.clear()
+            self._seen_version = v
+
+    def embed_query(self, query):
+        """Query embedding through L1."""
+        self._check_version()
+        key = canonical_query(query)
+        vec = self.embeddings.get(key)
+        if vec is None:
+            vec = self.vectordb.embeddings.embed_query(query)
+            self.embeddings.put(key, vec)
+        return vec
+
+    def _load(self, ids):
+        got = self.vectordb.get(ids=ids, include=["documents", "metadatas"])
+        by_id = {i: Document(page_content=d, metadata=m or {})
+                 for i, d, m in zip(got["ids"], got["documents"], got["metadatas"])}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def vectors(self, ids):
+        """Stored vectors of the given poi_ids from the index ({id: vector}), unknown ids skipped."""
+        self._check_version()
+        found = {}
+        for i in ids:
+            v = self.doc_vectors.get(i)
+            if v is not None:
+                found[i] = v
+        missing = [i for i in ids if i not in found]
+        if missing:
+            got = self.vectordb.get(ids=missing, include=["embeddings"])
+            for i, v in zip(got["ids"], got["embeddings"]):
+                found[i] = v
+                self.doc_vectors.put(i, v)
+        return found
+
+    def similarity_search(self, query, k=TOP_K, filter=None):
+        """Top-k documents for query, served from L2 when the same search ran before."""
+        self._check_version()
+        fkey = hashlib.sha1(json.dumps(filter, sort_keys=True).encode("utf-8")).hexdigest() if filter else None
+        key = (canonical_query(query), k, fkey)
+        ids = self.results.get(key)
+        if ids is not None:
+            docs = self._load(ids)
+            if len(docs) == len(ids):
+                return docs
+
+        docs = self.vectordb.similarity_search_by_vector(self.embed_query(query), k=k, filter=filter)
+        ids = [d.metadata.get("poi_id") for d in docs]
+        if all(ids):
+            self.results.put(key, ids)
+        return docs
+
+    def stats(self):
+        return {
+            "embeddings": self.embeddings.stats(),
+            "results": self.results.stats(),
+            "doc_vectors": self.doc_vectors.stats(),
+        }
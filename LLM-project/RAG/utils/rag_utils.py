@@ -1,8 +1,18 @@
-import os, json, math, re
+import os, json, math, re, hashlib
+import numpy as np
 from langchain_community.vectorstores import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain.schema import Document
-from config import PERSIST_DIR, DATA_PATH, EMBED_MODEL, RADIUS_KM
+from config import (
+    PERSIST_DIR, DATA_PATH, EMBED_MODEL, RADIUS_KM, TOP_K, GEO_MAX_CANDIDATES,
+    VECTOR_BACKEND, ANN_INDEX_PATH, IVF_NLIST, ANN_QUANTIZATION, ANN_PCA_DIM, LOCAL_EMBED_IDF_PATH,
+)
+from utils.poi_store import POIStore, record_ids, FILTER_FIELDS, filter_value
+from utils.embed_pipeline import EmbeddingPipeline
+from utils.embed_cache import EmbeddingCache, CachedEmbeddings
+from utils.local_embeddings import local_embeddings
+from utils.ann_index import IVFIndex, ANNVectorStore
+from utils.gazetteer import fold_name
 
 # type field map
 TYPE_FIELD_MAP = {
@@ -67,10 +77,10 @@ def normalize_geo_terms(text: str) -> str:
 
 # data loading
 def load_dataset():
-    """Load main tourism dataset from JSON file."""
+    """Load main tourism dataset from JSON file into a columnar POIStore."""
     with open(DATA_PATH, "r", encoding="utf-8") as f:
         data = json.load(f)
-    return data if isinstance(data, list) else []
+    return POIStore(data if isinstance(data, list) else [])
 
 
 # document creation
@@ -84,12 +94,13 @@ def to_map_link(lat, lon):
     return f"https://www.google.com/maps?q={lat},{lon}" if lat and lon else None
 
 
-def extract_meta(r):
-    """Extract metadata and ensure Chroma-safe primitive values."""
+def record_meta(r, poi_id=None):
+    """Display metadata for a record (links, image, coordinates) as primitive values."""
     img = r.get("main_image") or r.get("image")
     lat, lon = r.get("latitude"), r.get("longitude")
 
     meta = {
+        "poi_id": poi_id,
         "name": r.get("name") or r.get("alternate_name") or "Unnamed",
         "city": r.get("city"),
         "region": r.get("region"),
@@ -113,30 +124,229 @@ def extract_meta(r):
     return safe_meta
 
 
+def extract_meta(r, poi_id=None):
+    """Metadata stored in the vector index: the record id plus normalized city/region/type for filtering.
 
-def make_doc_from_record(r):
+    Display payloads live in the record store.
+    """
+    if not poi_id:
+        return record_meta(r)
+    meta = {"poi_id": poi_id}
+    for f in FILTER_FIELDS:
+        v = filter_value(f, r.get(f))
+        if v is not None:
+            meta[f] = v
+    return meta
+
+
+# metadata filters
+INTENT_TYPES = {"restaurant": "schema:FoodEstablishment", "hotel": "schema:LodgingBusiness"}
+
+
+def build_filter(place=None, place_type=None):
+    """Index filter (Chroma where syntax) for a gazetteer entry and/or schema type; None if empty."""
+    conds = []
+    if place and place.get("kind") == "city":
+        conds.append({"city": filter_value("city", place["name"])})
+    elif place and place.get("kind") == "region":
+        conds.append({"region": place.get("slug") or fold_name(place["name"]).replace(" ", "-")})
+    if place_type:
+        conds.append({"type": place_type})
+    if not conds:
+        return None
+    return conds[0] if len(conds) == 1 else {"$and": conds}
+
+
+def make_doc_from_record(r, poi_id=None):
     """Convert a single dataset record into a LangChain Document for embedding."""
     fields = map_fields_by_type(r)
     lines = [f"{f}: {r.get(f)}" for f in fields if r.get(f)]
-    return Document(page_content="\n".join(lines), metadata=extract_meta(r))
+    return Document(page_content="\n".join(lines), metadata=extract_meta(r, poi_id))
 
 
 # vector store build
-def build_vectorstore(dataset):
-    """Build or load the Chroma vector store."""
-    embeddings = GoogleGenerativeAIEmbeddings(model=EMBED_MODEL)
-
-    # If already built, reuse persisted DB
-    if os.path.isdir(PERSIST_DIR) and os.listdir(PERSIST_DIR):
-        return Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
-
-    # Otherwise, create from dataset
-    docs = [make_doc_from_record(r) for r in dataset]
-    db = Chroma.from_documents(docs, embedding=embeddings, persist_directory=PERSIST_DIR)
-    db.persist()
+FIELD_MAP_VERSION = hashlib.sha1(json.dumps(TYPE_FIELD_MAP, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+MANIFEST_PATH = os.path.join(PERSIST_DIR, "manifest.json")
+CHECKPOINT_PATH = os.path.join(PERSIST_DIR, "embed_checkpoint.bin")
+SYNC_BATCH = 2000
+
+
+def content_hash(doc):
+    """Hash of everything that ends up in the index for one document."""
+    payload = doc.page_content + "\x00" + json.dumps(doc.metadata, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def embed_key(text):
+    """Key for one embedding: changes with the text or the embedding model."""
+    return hashlib.sha1(f"{EMBED_MODEL}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def read_manifest():
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(manifest):
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def get_embeddings():
+    """Google embeddings behind the persistent (model, text) -> vector cache.
+
+    A "local:" EMBED_MODEL is computed in-process instead and skips the
+    cache, since recomputing is cheaper than the lookup.
+    """
+    if EMBED_MODEL.startswith("local:"):
+        def corpus():
+            dataset = load_dataset()
+            return [make_doc_from_record(r, pid).page_content for r, pid in zip(dataset, dataset.ids)]
+        return local_embeddings(EMBED_MODEL, corpus, LOCAL_EMBED_IDF_PATH)
+    return CachedEmbeddings(GoogleGenerativeAIEmbeddings(model=EMBED_MODEL), EmbeddingCache(), EMBED_MODEL)
+
+
+def build_vectorstore(dataset, embeddings=None, backend=None):
+    """Open the persisted vector store and sync it with the dataset.
+
+    Documents are keyed by poi_id. A manifest in PERSIST_DIR records each
+    document's content hash, so only new or changed documents are embedded
+    and upserted and vanished ones are deleted. A different EMBED_MODEL
+    means a different vector space, so the collection is rebuilt from scratch.
+    Embedding goes through EmbeddingPipeline (batched, concurrent, rate
+    limited, checkpointed) and the persistent embedding cache, so a wiped
+    or rebuilt collection re-embeds only text the cache has never seen;
+    pass `embeddings` to use another backend. VECTOR_BACKEND (or `backend`)
+    "ivf" selects the in-process ANN index instead of Chroma, and "sharded"
+    one such index per region (see utils.shards).
+    """
+    embeddings = embeddings or get_embeddings()
+    backend = backend or VECTOR_BACKEND
+    if backend == "ivf":
+        return build_ann_store(dataset, embeddings)
+    if backend == "sharded":
+        from utils.shards import build_shards  # utils.shards imports this module
+        return build_shards(dataset, embeddings)
+    db = Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
+
+    manifest = read_manifest()
+    known = manifest.get("docs", {})
+    if manifest.get("embed_model") != EMBED_MODEL:
+        db.delete_collection()
+        db = Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
+        known = {}
+
+    ids = getattr(dataset, "ids", None) or record_ids(dataset)
+    docs = {pid: make_doc_from_record(r, pid) for r, pid in zip(dataset, ids)}
+    hashes = {pid: content_hash(d) for pid, d in docs.items()}
+    changed = [pid for pid, h in hashes.items() if known.get(pid) != h]
+    removed = [pid for pid in known if pid not in hashes]
+
+    for i in range(0, len(removed), SYNC_BATCH):
+        db.delete(ids=removed[i:i + SYNC_BATCH])
+    pipeline = EmbeddingPipeline(embeddings, checkpoint_path=CHECKPOINT_PATH)
+    for i in range(0, len(changed), SYNC_BATCH):
+        batch = changed[i:i + SYNC_BATCH]
+        keys = [embed_key(docs[pid].page_content) for pid in batch]
+        vectors = pipeline.embed(keys, [docs[pid].page_content for pid in batch])
+        db._collection.upsert(
+            ids=batch,
+            embeddings=[list(map(float, vectors[k])) for k in keys],
+            documents=[docs[pid].page_content for pid in batch],
+            metadatas=[docs[pid].metadata for pid in batch],
+        )
+        # Checkpoint so an interrupted sync resumes instead of starting over
+        known = {pid: h for pid, h in known.items() if pid in hashes}
+        known.update({pid: hashes[pid] for pid in batch})
+        write_manifest({"embed_model": EMBED_MODEL, "field_map_version": FIELD_MAP_VERSION, "docs": known})
+
+    write_manifest({"embed_model": EMBED_MODEL, "field_map_version": FIELD_MAP_VERSION, "docs": hashes})
+    pipeline.checkpoint.clear()
+    if changed or removed:
+        print(f"Vector store sync: {len(changed)} upserted, {len(removed)} deleted, {len(hashes)} total")
     return db
 
 
+def build_ann_store(dataset, embeddings):
+    """Load the IVF index from ANN_INDEX_PATH, rebuilding it when the dataset changed.
+
+    Vectors of documents whose content hash is unchanged are reused from
+    the previous index; only new or changed text goes to the embedder.
+    """
+    ids = getattr(dataset, "ids", None) or record_ids(dataset)
+    docs = [make_doc_from_record(r, pid) for r, pid in zip(dataset, ids)]
+    hashes = [content_hash(d) for d in docs]
+    info = {"embed_model": EMBED_MODEL, "field_map_version": FIELD_MAP_VERSION, "nlist": IVF_NLIST,
+            "quantization": ANN_QUANTIZATION, "pca_dim": ANN_PCA_DIM}
+
+    old = None
+    if os.path.exists(ANN_INDEX_PATH):
+        try:
+            old = IVFIndex.load(ANN_INDEX_PATH)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable ANN index: {e}")
+    if old is not None and old.info == info and sorted(zip(old.ids, old.hashes)) == sorted(zip(ids, hashes)):
+        return ANNVectorStore(old, embeddings)
+
+    reuse = {}
+    if old is not None and old.info.get("embed_model") == EMBED_MODEL:
+        reuse = {pid: row for row, pid in enumerate(old.ids)}
+    changed = [i for i, (pid, h) in enumerate(zip(ids, hashes))
+               if pid not in reuse or old.hashes[reuse[pid]] != h]
+    pipeline = EmbeddingPipeline(embeddings, checkpoint_path=ANN_INDEX_PATH + ".ckpt")
+    keys = [embed_key(docs[i].page_content) for i in changed]
+    fresh = pipeline.embed(keys, [docs[i].page_content for i in changed])
+    fresh = dict(zip(changed, (fresh[k] for k in keys)))
+
+    vectors = np.array([fresh[i] if i in fresh else old.vectors[reuse[ids[i]]] for i in range(len(ids))],
+                       dtype=np.float32)
+    index = IVFIndex.build(
+        ids, vectors, [d.page_content for d in docs], [d.metadata for d in docs], hashes,
+        info=info, quantization=ANN_QUANTIZATION, pca_dim=ANN_PCA_DIM,
+    )
+    index.save(ANN_INDEX_PATH)
+    pipeline.checkpoint.clear()
+    print(f"ANN index built: {len(ids)} docs ({len(changed)} embedded), {index.nlist} lists")
+    return ANNVectorStore(index, embeddings)
+
+
+def materialize_docs(docs, records):
+    """Replace the id-only metadata of retrieved docs with display metadata from the record store."""
+    out = []
+    for d in docs:
+        poi_id = d.metadata.get("poi_id")
+        rec = records.get(poi_id) if poi_id else None
+        meta = record_meta(rec, poi_id) if rec else d.metadata
+        out.append(Document(page_content=d.page_content, metadata=meta))
+    return out
+
+
+# geo-constrained retrieval
+def geo_similarity_search(vectordb, dataset, query, lat, lon, k=TOP_K, radius_km=RADIUS_KM, filter=None):
+    """Vector search restricted to POIs within radius_km of (lat, lon).
+
+    The spatial index picks up to GEO_MAX_CANDIDATES nearby records
+    (matching `filter`, if given) and their ids go to the vector store as
+    a metadata filter, so only local candidates are scored. Returns None
+    when nothing is in range so the caller can fall back to a global search.
+    """
+    allowed = dataset.rows_where(filter) if filter else None
+    if allowed is None:
+        rows, _ = dataset.spatial.radius(lat, lon, radius_km, GEO_MAX_CANDIDATES)
+    else:
+        rows, _ = dataset.spatial.radius(lat, lon, radius_km)
+        rows = rows[np.isin(rows, allowed)][:GEO_MAX_CANDIDATES]
+    if not len(rows):
+        return None
+    ids = [dataset.ids[i] for i in rows]
+    return vectordb.similarity_search(query, k=k, filter={"poi_id": {"$in": ids}})
+
+
 # output utilities
 def preserve_swedish_names(t: str) -> str:
     """Restore correct Swedish spellings after model output."""
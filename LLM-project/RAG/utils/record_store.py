@@ -0,0 +1,128 @@
+"""
+On-disk POI payload store with an id -> byte-span index and mmap reads.
+
+Layout under RECORD_STORE_DIR:
+- records.bin    concatenated UTF-8 JSON records, sorted by poi_id
+- ids.npy        sorted fixed-width poi_id bytes (loaded with mmap_mode="r")
+- spans.npy      int64 [start, end) byte span per id
+- manifest.json  source file (path, mtime, size) and record count
+
+The vector index only carries poi_id; the app materializes the handful
+of hits it renders from here, so payloads are neither duplicated in
+Chroma metadata nor parsed up front.
+"""
+import json
+import mmap
+import os
+import sys
+import numpy as np
+from config import DATA_PATH, RECORD_STORE_DIR
+
+FILES = ("records.bin", "ids.npy", "spans.npy")
+
+
+def _source_key(path):
+    try:
+        st = os.stat(path)
+        return [os.path.abspath(path), st.st_mtime_ns, st.st_size]
+    except OSError:
+        return [os.path.abspath(path), None, None]
+
+
+def write_record_store(records, ids, directory=None, source=None):
+    """Write records (dict-likes) under their ids; files are swapped in atomically."""
+    directory = directory or RECORD_STORE_DIR
+    os.makedirs(directory, exist_ok=True)
+    order = sorted(range(len(ids)), key=lambda i: ids[i])
+    spans, pos = [], 0
+    tmp = {name: os.path.join(directory, name + ".tmp") for name in FILES}
+
+    with open(tmp["records.bin"], "wb") as f:
+        for i in order:
+            blob = json.dumps(dict(records[i]), ensure_ascii=False).encode("utf-8")
+            f.write(blob)
+            spans.append((pos, pos + len(blob)))
+            pos += len(blob)
+
+    width = max((len(pid.encode("utf-8")) for pid in ids), default=1)
+    with open(tmp["ids.npy"], "wb") as f:
+        np.save(f, np.array([ids[i].encode("utf-8") for i in order], dtype=f"S{width}"))
+    with open(tmp["spans.npy"], "wb") as f:
+        np.save(f, np.array(spans, dtype=np.int64).reshape(-1, 2))
+    for name in FILES:
+        os.replace(tmp[name], os.path.join(directory, name))
+
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"source": _source_key(source) if source else None, "count": len(ids)}, f)
+
+
+class RecordStore:
+    """Read-only, lazily paged view of a written record store."""
+
+    def __init__(self, directory=None):
+        directory = directory or RECORD_STORE_DIR
+        self._ids = np.load(os.path.join(directory, "ids.npy"), mmap_mode="r")
+        self._spans = np.load(os.path.join(directory, "spans.npy"), mmap_mode="r")
+        self._file = open(os.path.join(directory, "records.bin"), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _find(self, poi_id):
+        if not poi_id:
+            return None
+        key = poi_id.encode("utf-8")
+        i = int(np.searchsorted(self._ids, key))
+        if i < len(self._ids) and self._ids[i] == key:
+            return i
+        return None
+
+    def __contains__(self, poi_id):
+        return self._find(poi_id) is not None
+
+    def get(self, poi_id):
+        """Decoded record dict for poi_id, or None."""
+        i = self._find(poi_id)
+        if i is None:
+            return None
+        start, end = self._spans[i]
+        return json.loads(self._mm[start:end].decode("utf-8"))
+
+    def get_many(self, poi_ids):
+        """Records for several ids (None for unknown ones), in the given order."""
+        return [self.get(pid) for pid in poi_ids]
+
+    def memory_usage(self):
+        # Pages are mapped from disk on demand; only the index arrays count as resident
+        return sys.getsizeof(self) + self._ids.nbytes + self._spans.nbytes
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+
+def open_record_store(load_dataset, source=None, directory=None):
+    """Open the store, rewriting it first if it is missing or older than source.
+
+    load_dataset is only called on a (re)build and must return a POIStore.
+    """
+    source = source or DATA_PATH
+    directory = directory or RECORD_STORE_DIR
+    try:
+        with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as f:
+            fresh = json.load(f).get("source") == _source_key(source)
+    except (OSError, ValueError):
+        fresh = False
+    if not fresh or not all(os.path.exists(os.path.join(directory, n)) for n in FILES):
+        dataset = load_dataset()
+        write_record_store(dataset, dataset.ids, directory, source)
+    return RecordStore(directory)
+
+
+if __name__ == "__main__":
+    from utils.rag_utils import load_dataset
+    store = open_record_store(load_dataset)
+    print(f"Record store at {RECORD_STORE_DIR}: {len(store)} records")
@@ -0,0 +1,139 @@
+"""
+Process-wide registry for expensive shared objects (LLM client, dataset,
+vector store, JSON side files).
+
+Streamlit re-executes app.py on every widget interaction, but imported
+modules live for the whole server process, so objects held here are
+built once and shared by every session and rerun. Each resource has a
+version key (e.g. data file mtimes); when the key changes the resource
+and everything depending on it is rebuilt on next access.
+"""
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+
+def file_version(*paths):
+    """Version key from (path, mtime, size) of each file; missing files count too."""
+    key = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            key.append((p, st.st_mtime_ns, st.st_size))
+        except OSError:
+            key.append((p, None, None))
+    return tuple(key)
+
+
+def estimate_size(obj, _seen=None, _depth=0):
+    """Rough deep size in bytes; uses obj.memory_usage() or ndarray.nbytes when available."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen or _depth > 8:
+        return 0
+    _seen.add(id(obj))
+    if hasattr(obj, "memory_usage") and callable(obj.memory_usage) and not isinstance(obj, type):
+        try:
+            return int(obj.memory_usage())
+        except TypeError:
+            pass
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        items = [x for kv in obj.items() for x in kv]
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        items = list(obj)
+    else:
+        items = list(getattr(obj, "__dict__", {}).values())
+        items += [getattr(obj, s) for s in getattr(type(obj), "__slots__", ()) if hasattr(obj, s)]
+    return size + sum(estimate_size(x, _seen, _depth + 1) for x in items)
+
+
+class ResourceRegistry:
+    """Build-once, version-checked shared resources with per-resource locks."""
+
+    def __init__(self):
+        self._specs = {}
+        self._entries = {}
+        self._locks = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name, builder, version=None, depends=()):
+        """Declare a resource. Re-registering an existing name is a no-op.
+
+        builder: zero-arg callable producing the object.
+        version: zero-arg callable returning a hashable key; a new key forces a rebuild.
+        depends: names whose versions are folded into this resource's key.
+        """
+        with self._registry_lock:
+            if name not in self._specs:
+                self._specs[name] = (builder, version, tuple(depends))
+                self._locks[name] = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self._specs
+
+    def version_of(self, name):
+        builder, version, depends = self._specs[name]
+        own = version() if version else None
+        return (own, tuple(self.version_of(d) for d in depends))
+
+    def get(self, name):
+        """Return the resource, building or rebuilding it if its version changed."""
+        key = self.version_of(name)
+        entry = self._entries.get(name)
+        if entry and entry["version"] == key:
+            return entry["value"]
+        with self._locks[name]:
+            entry = self._entries.get(name)
+            if entry and entry["version"] == key:
+                return entry["value"]
+            builder = self._specs[name][0]
+            start = time.perf_counter()
+            value = builder()
+            self._entries[name] = {
+                "value": value,
+                "version": key,
+                "built_at": time.time(),
+                "build_s": time.perf_counter() - start,
+                "bytes": estimate_size(value),
+            }
+            return value
+
+    def warm_up(self, names=None):
+        """Build every (or the named) resource now; returns names that failed."""
+        failed = []
+        for name in names or list(self._specs):
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Warm-up of {name} failed: {e}")
+                failed.append(name)
+        return failed
+
+    def invalidate(self, name=None):
+        """Drop one (or every) built resource so the next get() rebuilds it."""
+        with self._registry_lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self):
+        """Per-resource build time and estimated memory for the debug panel."""
+        return {
+            name: {
+                "built_at": time.strftime("%H:%M:%S", time.localtime(e["built_at"])),
+                "build_s": round(e["build_s"], 3),
+                "mb": round(e["bytes"] / 1e6, 2),
+            }
+            for name, e in self._entries.items()
+        }
+
+
+registry = ResourceRegistry()
@@ -0,0 +1,181 @@
+"""
+Client for the retrieval service (service/main.py).
+
+Region shards are spread over the service instances with a consistent
+hash ring, so adding or removing an instance only moves the shards that
+hashed next to it. A query is sent only to the instances owning shards
+its filter can match (all of them for unfiltered queries), concurrently,
+over one pooled httpx.AsyncClient; the per-instance hits are merged by
+score. The client runs its own event loop on a background thread, so the
+pool survives Streamlit reruns and the synchronous ``similarity_search``
+works as a drop-in for a vector store.
+"""
+import asyncio
+import bisect
+import hashlib
+import threading
+import time
+import httpx
+import numpy as np
+from langchain.schema import Document
+from config import TOP_K, RETRIEVAL_TIMEOUT_S, RETRIEVAL_MAX_CONNECTIONS
+from utils.shards import shard_of_rows
+
+
+def node_url(url):
+    """Canonical form of a service URL, so ring keys match however the address was written."""
+    return url.strip().rstrip("/")
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes."""
+
+    def __init__(self, nodes, vnodes=64):
+        self.nodes = list(dict.fromkeys(nodes))
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._keys = [p for p, _ in points]
+        self._owners = [n for _, n in points]
+
+    def node_for(self, key):
+        if not self._keys:
+            raise ValueError("Hash ring has no nodes")
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[i]
+
+
+class RetrievalClient:
+    """Scatter-gather search over the retrieval service instances."""
+
+    def __init__(self, urls, dataset, timeout=RETRIEVAL_TIMEOUT_S, max_connections=RETRIEVAL_MAX_CONNECTIONS):
+        self.ring = HashRing([node_url(u) for u in urls])
+        self.dataset = dataset
+        self._shard_of_row = np.array(shard_of_rows(dataset), dtype=object)
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True, name="retrieval-client").start()
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+
+        async def make_client():
+            return httpx.AsyncClient(timeout=timeout, limits=limits)
+
+        self._http = self._call(make_client())
+        self.requests = self.errors = self.rejected = 0
+        self._ms = 0.0
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _on_loop(self, coro):
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    def nodes_for(self, filter=None):
+        """Instances owning at least one shard the filter can match."""
+        rows = self.dataset.rows_where(filter) if filter else None
+        if rows is None:
+            return list(self.ring.nodes)
+        return list(dict.fromkeys(self.ring.node_for(s) for s in dict.fromkeys(self._shard_of_row[rows])))
+
+    async def _post(self, node, path, payload, field):
+        """JSON body of a reply carrying `field`, or None when the instance rejected or failed the call."""
+        start = time.perf_counter()
+        self.requests += 1
+        try:
+            resp = await self._http.post(f"{node}{path}", json=payload)
+            resp.raise_for_status()
+            body = resp.json()
+            if not isinstance(body, dict) or field not in body:
+                raise ValueError(f"reply without {field!r}")
+            return body
+        except httpx.HTTPStatusError as e:
+            # 4xx: this request is bad and would fail anywhere; 5xx: the instance is in trouble
+            if e.response.status_code < 500:
+                self.rejected += 1
+                print(f"Retrieval service {node} rejected the request: {e.response.text[:200]}")
+            else:
+                self.errors += 1
+                print(f"Retrieval service {node} failed: {e}")
+            return None
+        except (httpx.HTTPError, ValueError) as e:
+            # ValueError covers a body that is not JSON (json.JSONDecodeError) or not the expected shape
+            self.errors += 1
+            print(f"Retrieval service {node} failed: {e}")
+            return None
+        finally:
+            self._ms += (time.perf_counter() - start) * 1000
+
+    async def _search(self, query, k, filter):
+        payload = {"query": query, "k": k, "filter": filter}
+        parts = await asyncio.gather(*(self._post(n, "/search", payload, "hits") for n in self.nodes_for(filter)))
+        return _merge([p["hits"] for p in parts if p], k)
+
+    async def _search_batch(self, requests):
+        # One batch call per instance, carrying only the requests it has shards for
+        by_node = {}
+        for i, (query, k, filter) in enumerate(requests):
+            for node in self.nodes_for(filter):
+                by_node.setdefault(node, []).append(i)
+        nodes = list(by_node)
+        replies = await asyncio.gather(*(
+            self._post(n, "/search_batch", {"requests": [
+                {"query": requests[i][0], "k": requests[i][1], "filter": requests[i][2]} for i in by_node[n]
+            ]}, "results") for n in nodes
+        ))
+        hits = [[] for _ in requests]
+        for node, reply in zip(nodes, replies):
+            if reply:
+                for i, result in zip(by_node[node], reply["results"]):
+                    hits[i].extend(result["hits"])
+        return [_merge([h], req[1]) for h, req in zip(hits, requests)]
+
+    async def _get_records(self, ids):
+        # Every instance serves the full record store; spread ids by the ring
+        by_node = {}
+        for pid in ids:
+            by_node.setdefault(self.ring.node_for(pid), []).append(pid)
+        replies = await asyncio.gather(*(self._post(n, "/records", {"ids": p}, "records") for n, p in by_node.items()))
+        records = {}
+        for reply in replies:
+            if reply:
+                records.update(reply["records"])
+        return [records.get(pid) for pid in ids]
+
+    async def asearch(self, query, k=TOP_K, filter=None):
+        return await self._on_loop(self._search(query, k, filter))
+
+    async def asearch_batch(self, requests):
+        """requests: [(query, k, filter)]; returns one document list per request."""
+        return await self._on_loop(self._search_batch(requests))
+
+    async def aget_records(self, ids):
+        return await self._on_loop(self._get_records(ids))
+
+    def similarity_search(self, query, k=TOP_K, filter=None, **kwargs):
+        return self._call(self._search(query, k, filter))
+
+    def search_batch(self, requests):
+        return self._call(self._search_batch(requests))
+
+    def get_records(self, ids):
+        return self._call(self._get_records(ids))
+
+    def stats(self):
+        return {
+            "nodes": self.ring.nodes,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "avg_ms": round(self._ms / self.requests, 2) if self.requests else None,
+        }
+
+
+def _merge(hit_lists, k):
+    best = {}
+    for hits in hit_lists:
+        for h in hits:
+            if h["id"] not in best or h["score"] > best[h["id"]]["score"]:
+                best[h["id"]] = h
+    top = sorted(best.values(), key=lambda h: -h["score"])[:k]
+    return [Document(page_content=h["document"], metadata=h["metadata"]) for h in top]
@@ -0,0 +1,316 @@
+"""
+Region-partitioned vector + lexical index shards with query routing.
+
+Every region (the slug of the record's region URI; records without one
+go to "_none") gets its own IVF index file under SHARD_DIR, next to a
+BM25 index over the same documents built at the same time. Shards are
+loaded on first use and kept in an LRU of at most SHARD_MAX_RESIDENT,
+so a replica only holds the regions it is actually asked about. A
+query holds on to the shards it reads until it is done, and a fan-out
+over more shards than fit in the LRU reads the extra ones without
+caching them, so it never evicts a shard it is about to use (or that
+the next query will use).
+
+Routing needs no extra API: a query's metadata filter (city, region,
+type, or the geo candidate ids) resolves to rows through the dataset's
+posting lists, and the regions of those rows are the shards to search.
+Unfiltered queries fan out to every shard in parallel and the hits are
+merged by cosine similarity, which is comparable across shards because
+they share one embedding space.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain.schema import Document
+from config import (
+    EMBED_MODEL, TOP_K, SHARD_DIR, SHARD_MAX_RESIDENT, SHARD_FANOUT_WORKERS,
+    IVF_NLIST, ANN_QUANTIZATION, ANN_PCA_DIM,
+)
+from utils.ann_index import IVFIndex
+from utils.embed_pipeline import EmbeddingPipeline
+from utils.lexical_index import BM25Index, lexical_text
+from utils.poi_store import filter_value
+from utils.rag_utils import make_doc_from_record, content_hash, embed_key, FIELD_MAP_VERSION
+
+NO_REGION = "_none"
+
+
+def shard_of_rows(dataset):
+    """Region shard name for every row of a POIStore."""
+    names = [filter_value("region", v) or NO_REGION for v in dataset.categories("region")]
+    codes = dataset.codes("region")
+    return [NO_REGION if c < 0 else names[c] for c in codes]
+
+
+def lexical_path(path):
+    """BM25 file stored next to a shard's IVF file."""
+    return path[:-len(".npz")] + ".bm25.npz"
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_shards(dataset, embeddings, directory=None):
+    """(Re)build the shard files whose documents changed and return a ShardedStore.
+
+    Unchanged shards are neither embedded nor loaded; embeddings of changed
+    ones come through the embedding cache, so only new text costs a call.
+    """
+    directory = directory or SHARD_DIR
+    os.makedirs(directory, exist_ok=True)
+    info = {"embed_model": EMBED_MODEL, "field_map_version": FIELD_MAP_VERSION, "nlist": IVF_NLIST,
+            "quantization": ANN_QUANTIZATION, "pca_dim": ANN_PCA_DIM}
+    old = _read_manifest(directory)
+    old_shards = old.get("shards", {}) if old.get("info") == info else {}
+
+    groups = {}
+    for row, shard in enumerate(shard_of_rows(dataset)):
+        groups.setdefault(shard, []).append(row)
+
+    shards, stale = {}, {}
+    for shard, rows in sorted(groups.items()):
+        ids = [dataset.ids[r] for r in rows]
+        docs = [make_doc_from_record(dataset[r], pid) for r, pid in zip(rows, ids)]
+        hashes = [content_hash(d) for d in docs]
+        digest = hashlib.sha1("\n".join(sorted(f"{i} {h}" for i, h in zip(ids, hashes))).encode("utf-8")).hexdigest()
+        shards[shard] = {"path": f"{shard}.npz", "count": len(ids), "digest": digest}
+        path = os.path.join(directory, f"{shard}.npz")
+        if (old_shards.get(shard, {}).get("digest") != digest or not os.path.exists(path)
+                or not os.path.exists(lexical_path(path))):
+            stale[shard] = (ids, docs, hashes)
+
+    # One embedding pass over every stale shard keeps batches full
+    texts = {embed_key(d.page_content): d.page_content for _, docs, _ in stale.values() for d in docs}
+    pipeline = EmbeddingPipeline(embeddings, checkpoint_path=os.path.join(directory, "embed_checkpoint.bin"))
+    vectors = pipeline.embed(list(texts), list(texts.values()))
+    for shard, (ids, docs, hashes) in stale.items():
+        index = IVFIndex.build(
+            ids, np.array([vectors[embed_key(d.page_content)] for d in docs], dtype=np.float32),
+            [d.page_content for d in docs], [d.metadata for d in docs], hashes,
+            info=info, quantization=ANN_QUANTIZATION, pca_dim=ANN_PCA_DIM,
+        )
+        path = os.path.join(directory, shards[shard]["path"])
+        index.save(path)
+        BM25Index(ids, [lexical_text(d.page_content) for d in docs]).save(lexical_path(path))
+    pipeline.checkpoint.clear()
+
+    for shard, entry in old.get("shards", {}).items():
+        if shard not in shards:
+            for p in (entry["path"], entry["path"].replace(".npz", ".vectors.npy"), lexical_path(entry["path"])):
+                try:
+                    os.remove(os.path.join(directory, p))
+                except OSError:
+                    pass
+    tmp = os.path.join(directory, "manifest.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"info": info, "shards": shards}, f)
+    os.replace(tmp, os.path.join(directory, "manifest.json"))
+    if stale:
+        print(f"Shards: rebuilt {len(stale)} of {len(shards)}")
+    return ShardedStore(dataset, embeddings, directory)
+
+
+class _Shard:
+    """One loaded region: its IVF index and a BM25 index over the same documents."""
+
+    def __init__(self, path):
+        self.index = IVFIndex.load(path)
+        try:
+            self.lexical = BM25Index.load(lexical_path(path))
+        except OSError:
+            # Shard written before BM25 was stored with it
+            self.lexical = BM25Index(self.index.ids, [lexical_text(self.index.document(r)) for r in range(len(self.index))])
+
+    def memory_usage(self):
+        return self.index.memory_usage() + self.lexical.memory_usage()
+
+
+class ShardedStore:
+    """Vector store facade over region shards, with lazy loading and filter-based routing.
+
+    owns: optional predicate on shard names; other shards are ignored
+    (a retrieval service instance serves only the shards it owns).
+    """
+
+    def __init__(self, dataset, embeddings, directory=None, max_resident=SHARD_MAX_RESIDENT,
+                 workers=SHARD_FANOUT_WORKERS, owns=None):
+        self.dataset = dataset
+        self.embeddings = embeddings
+        self.directory = directory or SHARD_DIR
+        self.manifest = {
+            name: entry for name, entry in _read_manifest(self.directory).get("shards", {}).items()
+            if owns is None or owns(name)
+        }
+        self.max_resident = max_resident
+        self._shard_of_row = np.array(shard_of_rows(dataset), dtype=object)
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self.manifest}
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self.loads = self.evictions = self.streamed = 0
+        self.lexical = ShardedLexical(self)
+
+    def shard(self, name, cache=True):
+        """Loaded shard `name`, loading it (and evicting the least recently used) if needed.
+
+        With cache=False a shard that is not resident is loaded for the
+        caller only and left out of the LRU.
+        """
+        with self._lock:
+            if name in self._resident:
+                self._resident.move_to_end(name)
+                return self._resident[name]
+            if not cache:
+                self.streamed += 1
+        if not cache:
+            return _Shard(os.path.join(self.directory, self.manifest[name]["path"]))
+        with self._load_locks[name]:
+            with self._lock:
+                if name in self._resident:
+                    return self._resident[name]
+            loaded = _Shard(os.path.join(self.directory, self.manifest[name]["path"]))
+            with self._lock:
+                self._resident[name] = loaded
+                self.loads += 1
+                while len(self._resident) > self.max_resident:
+                    self._resident.popitem(last=False)
+                    self.evictions += 1
+            return loaded
+
+    def route(self, filter=None):
+        """Shards that can hold matches for filter; every shard when it does not narrow the search."""
+        rows = self.dataset.rows_where(filter) if filter else None
+        if rows is None:
+            return list(self.manifest)
+        return [s for s in dict.fromkeys(self._shard_of_row[rows]) if s in self.manifest]
+
+    def _fan_out(self, fn, shards):
+        """[fn(name, shard) for each named shard], in parallel.
+
+        Resident shards are touched first, and only as many others as
+        still fit beside them go into the LRU; the rest are read
+        uncached. So the fan-out never evicts one of its own shards and
+        repeated fan-outs over more shards than fit do not thrash.
+        """
+        with self._lock:
+            hot = [s for s in shards if s in self._resident]
+            for s in hot:
+                self._resident.move_to_end(s)
+        room = max(self.max_resident - len(hot), 0)
+        cached = set(hot) | set([s for s in shards if s not in hot][:room])
+
+        def run(name):
+            return fn(name, self.shard(name, cache=name in cached))
+
+        if len(shards) == 1:
+            return [run(shards[0])]
+        return list(self._pool.map(run, shards))
+
+    def _search(self, embedding, k, filter):
+        """[(similarity, shard, row)] of the best k; the shards stay referenced until the docs are read."""
+        def one(name, shard):
+            rows, sims = shard.index.search(embedding, k, filter=filter)
+            return [(float(s), shard, int(r)) for r, s in zip(rows, sims)]
+
+        hits = [h for part in self._fan_out(one, self.route(filter)) for h in part]
+        hits.sort(key=lambda h: -h[0])
+        return hits[:k]
+
+    @staticmethod
+    def _doc(shard, row):
+        return Document(page_content=shard.index.document(row), metadata=shard.index.metadata(row))
+
+    def search_by_vector(self, embedding, k=TOP_K, filter=None):
+        """[(doc, cosine similarity)] of the best k, best first."""
+        return [(self._doc(shard, row), s) for s, shard, row in self._search(embedding, k, filter)]
+
+    def similarity_search_by_vector(self, embedding, k=TOP_K, filter=None, **kwargs):
+        return [self._doc(shard, row) for _, shard, row in self._search(embedding, k, filter)]
+
+    def similarity_search(self, query, k=TOP_K, filter=None, **kwargs):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k, filter)
+
+    def similarity_search_with_score(self, query, k=TOP_K, filter=None, **kwargs):
+        """(doc, cosine distance) pairs; lower is closer."""
+        hits = self._search(self.embeddings.embed_query(query), k, filter)
+        return [(self._doc(shard, row), 1.0 - s) for s, shard, row in hits]
+
+    def similarity_search_with_relevance_scores(self, query, k=TOP_K, filter=None, **kwargs):
+        """(doc, relevance in [0, 1]) pairs; higher is better."""
+        hits = self._search(self.embeddings.embed_query(query), k, filter)
+        return [(self._doc(shard, row), (1.0 + s) / 2) for s, shard, row in hits]
+
+    def get(self, ids=None, include=("documents", "metadatas")):
+        """Chroma-style lookup by id, loading only the shards the ids live in."""
+        if ids is None:
+            ids = self.dataset.ids
+        found = {}
+        for pid in ids:
+            rec = self.dataset.by_id(pid)
+            name = self._shard_of_row[rec.row] if rec is not None else None
+            if name in self.manifest:
+                index = self.shard(name).index
+                r = index.row_of(pid)
+                if r is not None:
+                    found[pid] = (index, r)
+        out = list(found)
+        return {
+            "ids": out,
+            "documents": [found[p][0].document(found[p][1]) for p in out] if "documents" in include else None,
+            "metadatas": [found[p][0].metadata(found[p][1]) for p in out] if "metadatas" in include else None,
+            "embeddings": [found[p][0].vectors[found[p][1]] for p in out] if "embeddings" in include else None,
+        }
+
+    def stats(self):
+        return {
+            "shards": len(self.manifest),
+            "resident": list(self._resident),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "streamed": self.streamed,
+        }
+
+    def memory_usage(self):
+        with self._lock:
+            return sum(s.memory_usage() for s in self._resident.values())
+
+
+class ShardedLexical:
+    """BM25 over the region shards, with the ``search(query, k, allowed_rows)`` shape of BM25Index.
+
+    allowed_rows are dataset rows; they are routed to their shards and
+    mapped to shard-local rows. Scores use per-shard statistics.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def search(self, query, k=TOP_K, allowed_rows=None):
+        store = self.store
+        if allowed_rows is None:
+            targets = {name: None for name in store.manifest}
+        else:
+            targets = {}
+            for row in allowed_rows:
+                name = store._shard_of_row[row]
+                if name in store.manifest:
+                    targets.setdefault(name, []).append(store.dataset.ids[row])
+
+        def one(name, shard):
+            local = None
+            if targets[name] is not None:
+                local = [r for r in map(shard.index.row_of, targets[name]) if r is not None]
+            return shard.lexical.search(query, k, local)
+
+        hits = [h for part in store._fan_out(one, list(targets)) for h in part]
+        hits.sort(key=lambda h: -h[1])
+        return hits[:k]
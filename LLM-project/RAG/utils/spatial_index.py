@@ -0,0 +1,170 @@
+import math
+import numpy as np
+from utils.geo_utils import EARTH_RADIUS_KM, haversine_np, top_k_smallest
+
+# ~11 km of latitude per cell; at Swedish latitudes a cell is 4-6 km wide
+DEFAULT_CELL_DEG = 0.1
+KM_PER_DEG = EARTH_RADIUS_KM * math.pi / 180
+
+
+class GridIndex:
+    """Fixed lat/lon cell grid over POI coordinates.
+
+    Points are stored sorted by cell so every cell is one contiguous slice.
+    Queries only touch the cells that can contain an answer: radius queries
+    read the cells overlapping the bounding box, k-nearest queries read
+    Chebyshev rings of cells around the query until no unread ring can
+    hold anything closer than the current k-th hit.
+
+    All queries return (rows, distances_km) sorted by distance, where rows
+    index the coordinate array the index was built from.
+    """
+
+    def __init__(self, coords, rows=None, cell_deg=DEFAULT_CELL_DEG):
+        rows = np.arange(len(coords)) if rows is None else np.asarray(rows, dtype=np.intp)
+        pts = coords[rows]
+        ok = ~np.isnan(pts).any(axis=1)
+        rows, pts = rows[ok], pts[ok]
+
+        self.cell_deg = cell_deg
+        ci = np.floor(pts[:, 0] / cell_deg).astype(np.int64)
+        cj = np.floor(pts[:, 1] / cell_deg).astype(np.int64)
+        order = np.lexsort((cj, ci))
+        self._rows = rows[order]
+        self._lat = np.ascontiguousarray(pts[order, 0])
+        self._lon = np.ascontiguousarray(pts[order, 1])
+
+        ci, cj = ci[order], cj[order]
+        change = np.flatnonzero((np.diff(ci) != 0) | (np.diff(cj) != 0)) + 1
+        self._starts = np.concatenate(([0], change)).astype(np.intp) if len(order) else np.empty(0, np.intp)
+        self._ends = np.concatenate((change, [len(order)])).astype(np.intp) if len(order) else np.empty(0, np.intp)
+        self._cell_i = ci[self._starts]
+        self._cell_j = cj[self._starts]
+        # Highest |lat| bounds how narrow a cell can get for the ring stop rule
+        self._max_abs_lat = float(np.abs(self._lat).max()) if len(self._lat) else 0.0
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def rows(self):
+        """Dataset rows held by this index (those with valid coordinates)."""
+        return self._rows
+
+    def _cell_of(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def _gather(self, cells):
+        """Positions (into the sorted arrays) of all points in the given cells."""
+        if len(cells) == 0:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate([np.arange(self._starts[c], self._ends[c]) for c in cells])
+
+    def _ring_bound_km(self, ring, lat):
+        """Lower bound on the distance to any point outside the first `ring` rings."""
+        if ring <= 0:
+            return 0.0
+        span = math.radians(ring * self.cell_deg)
+        lat_bound = EARTH_RADIUS_KM * span
+        cos_max = math.cos(math.radians(max(self._max_abs_lat, abs(lat))))
+        lon_bound = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, cos_max * math.sin(min(span, math.pi) / 2)))
+        return min(lat_bound, lon_bound)
+
+    def radius(self, lat, lon, radius_km, limit=None):
+        """All points within radius_km, closest first (at most `limit`)."""
+        if not len(self._rows) or radius_km < 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        dlat = radius_km / KM_PER_DEG
+        edge = min(89.9, max(abs(lat - dlat), abs(lat + dlat)))
+        dlon = min(180.0, dlat / math.cos(math.radians(edge)))
+        i0, j0 = self._cell_of(lat - dlat, lon - dlon)
+        i1, j1 = self._cell_of(lat + dlat, lon + dlon)
+        cells = np.flatnonzero(
+            (self._cell_i >= i0) & (self._cell_i <= i1) & (self._cell_j >= j0) & (self._cell_j <= j1)
+        )
+        pos = self._gather(cells)
+        dist = haversine_np(lat, lon, self._lat[pos], self._lon[pos])
+        keep = dist <= radius_km
+        pos, dist = pos[keep], dist[keep]
+        sel = top_k_smallest(dist, len(dist) if limit is None else limit)
+        return self._rows[pos[sel]], dist[sel]
+
+    def nearest(self, lat, lon, k):
+        """Exact k nearest points, scanning rings of cells outward from the query."""
+        if k <= 0 or not len(self._rows):
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        qi, qj = self._cell_of(lat, lon)
+        ring = np.maximum(np.abs(self._cell_i - qi), np.abs(self._cell_j - qj))
+        by_ring = np.argsort(ring, kind="stable")
+        ring_sorted = ring[by_ring]
+        bounds = np.flatnonzero(np.diff(ring_sorted)) + 1
+        groups = np.split(by_ring, bounds)
+
+        best_pos = np.empty(0, dtype=np.intp)
+        best_dist = np.empty(0)
+        for cells in groups:
+            r = int(ring[cells[0]])
+            if len(best_pos) >= k and best_dist[-1] <= self._ring_bound_km(r - 1, lat):
+                break
+            pos = self._gather(cells)
+            dist = haversine_np(lat, lon, self._lat[pos], self._lon[pos])
+            best_pos = np.concatenate((best_pos, pos))
+            best_dist = np.concatenate((best_dist, dist))
+            sel = top_k_smallest(best_dist, k)
+            best_pos, best_dist = best_pos[sel], best_dist[sel]
+        return self._rows[best_pos], best_dist
+
+    def expanding(self, lat, lon, k, radius_km, max_radius_km=None, growth=2.0):
+        """Grow radius_km by `growth` until it holds k points (or hits max_radius_km).
+
+        Returns the k closest points inside the final radius, so callers get
+        the same answer as repeated radius queries in a single ring scan.
+        """
+        rows, dist = self.nearest(lat, lon, k)
+        if not len(dist):
+            return rows, dist
+        final = radius_km
+        while final < dist[-1] and (max_radius_km is None or final < max_radius_km):
+            final *= growth
+        if max_radius_km is not None:
+            final = min(final, max_radius_km)
+        keep = dist <= final
+        return rows[keep], dist[keep]
+
+
+class PartitionedIndex:
+    """GridIndex over all POIs plus one GridIndex per record `type`.
+
+    Type-filtered queries (e.g. "schema:FoodEstablishment") run inside that
+    type's partition, so the top-k comes back already filtered instead of
+    truncating a mixed result list and post-filtering it.
+    """
+
+    def __init__(self, coords, types, cell_deg=DEFAULT_CELL_DEG):
+        self.all = GridIndex(coords, cell_deg=cell_deg)
+        rows_by_type = {}
+        for i, t in enumerate(types):
+            if t:
+                rows_by_type.setdefault(t, []).append(i)
+        self.by_type = {t: GridIndex(coords, rows, cell_deg) for t, rows in rows_by_type.items()}
+
+    def __len__(self):
+        return len(self.all)
+
+    def partition(self, place_type=None):
+        """Index for one type (None means all POIs); empty index for unknown types."""
+        if place_type is None:
+            return self.all
+        return self.by_type.get(place_type, _EMPTY)
+
+    def radius(self, lat, lon, radius_km, limit=None, place_type=None):
+        return self.partition(place_type).radius(lat, lon, radius_km, limit)
+
+    def nearest(self, lat, lon, k, place_type=None):
+        return self.partition(place_type).nearest(lat, lon, k)
+
+    def expanding(self, lat, lon, k, radius_km, max_radius_km=None, growth=2.0, place_type=None):
+        return self.partition(place_type).expanding(lat, lon, k, radius_km, max_radius_km, growth)
+
+
+_EMPTY = GridIndex(np.empty((0, 2)))
@@ -0,0 +1,96 @@
+"""
+Incremental post-processing of streamed model output.
+
+sanitize_output and preserve_swedish_names over the whole accumulated
+answer on every chunk make streaming O(n^2). StreamProcessor does the
+same work on the new text only. The ban-list check also looks at a few
+characters before each chunk, so a banned word split across chunks is
+still caught. The NAME_REMAP substitutions are applied to a pending
+tail that is committed only once no match can reach past it: the last
+`window` characters (at least the longest pattern) stay pending, and
+the commit point never falls inside a word or a match. Per-chunk work
+is proportional to the chunk plus that window.
+
+RenderThrottle limits bubble re-renders to STREAM_RENDER_FPS.
+"""
+import re
+import time
+from config import STREAM_RENDER_FPS
+from utils.text_utils import NAME_REMAP, BANNED_OUTPUT, REFUSAL
+
+_WORD = re.compile(r"\w")
+
+
+class StreamProcessor:
+    """Feed raw chunks, read the sanitized, name-corrected text so far."""
+
+    def __init__(self, remap=NAME_REMAP, banned=BANNED_OUTPUT, refusal=REFUSAL):
+        self._replacements = {f"g{i}": swe for i, swe in enumerate(remap.values())}
+        self._pattern = re.compile("|".join(f"(?P<g{i}>{pat})" for i, pat in enumerate(remap)))
+        self._window = max((len(p) for p in remap), default=0)
+        self._banned = [b.lower() for b in banned]
+        self._ban_carry = max((len(b) for b in banned), default=1) - 1
+        self.refusal = refusal
+        self.blocked = False
+        self._chunks = []
+        self._tail = ""  # last raw characters, for bans straddling chunks
+        self._done = []  # committed, substituted text
+        self._pending = ""  # raw text not yet committed
+
+    def _sub(self, text):
+        if not self._replacements:
+            return text
+        return self._pattern.sub(lambda m: self._replacements[m.lastgroup], text)
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        self._chunks.append(chunk)
+        if self.blocked:
+            return
+        scan = (self._tail + chunk).lower()
+        if any(b in scan for b in self._banned):
+            self.blocked = True
+            return
+        self._tail = (self._tail + chunk)[-self._ban_carry:] if self._ban_carry else ""
+
+        self._pending += chunk
+        cut = len(self._pending) - self._window
+        if cut <= 0:
+            return
+        # Never commit inside a match or between two word characters
+        for m in self._pattern.finditer(self._pending) if self._replacements else ():
+            if m.start() < cut < m.end():
+                cut = m.start()
+        while cut > 0 and _WORD.match(self._pending[cut - 1]) and _WORD.match(self._pending[cut]):
+            cut -= 1
+        if cut > 0:
+            self._done.append(self._sub(self._pending[:cut]))
+            self._pending = self._pending[cut:]
+
+    @property
+    def raw(self):
+        """Everything fed so far, unprocessed."""
+        return "".join(self._chunks)
+
+    @property
+    def text(self):
+        """Processed text so far (the refusal once a banned word appeared)."""
+        if self.blocked:
+            return self.refusal
+        return "".join(self._done) + self._sub(self._pending)
+
+
+class RenderThrottle:
+    """``due()`` is True at most fps times per second."""
+
+    def __init__(self, fps=STREAM_RENDER_FPS):
+        self.interval = 1.0 / fps
+        self._last = 0.0
+
+    def due(self):
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            return True
+        return False
@@ -15,6 +15,10 @@ NAME_REMAP = {
 def _lower_ascii(s): 
     return s.lower().replace("å","a").replace("ä","a").replace("ö","o").replace("é","e")
 
+def field_text(v):
+    """Plain string for a dataset field that may be a JSON-LD {"@value": ...} dict."""
+    return v.get("@value") if isinstance(v, dict) and "@value" in v else v
+
 def normalize_user_query_spelling(q):
     q_norm=q; q_lc=_lower_ascii(q)
     for bad,good in INPUT_ALIASES.items():
@@ -29,8 +33,10 @@ def is_safe_input(text: str) -> bool:
     banned = ["sex","suicide","kill","weapon","hate","politics","religion","terrorism","drugs"]
     return not any(b in text.lower() for b in banned)
 
+BANNED_OUTPUT = ["kill","hate","suicide","weapon","drugs","terrorism"]
+REFUSAL = "I’m sorry, I can’t discuss that. Let’s talk about Sweden instead!"
+
 def sanitize_output(text: str) -> str:
-    banned = ["kill","hate","suicide","weapon","drugs","terrorism"]
-    if any(b in text.lower() for b in banned):
-        return "I’m sorry, I can’t discuss that. Let’s talk about Sweden instead!"
+    if any(b in text.lower() for b in BANNED_OUTPUT):
+        return REFUSAL
     return text
@@ -0,0 +1,40 @@
+"""
+Read-only view of the gazetteer built by the RAG ingest step
+(RAG/utils/gazetteer.py), used to skip geocoding for known places.
+"""
+import json
+import os
+from loguru import logger
+
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "../gazetteer.json")
+
+def _fold(name):
+    s = name.lower().replace("å", "a").replace("ä", "a").replace("ö", "o").replace("é", "e")
+    return " ".join(s.split())
+
+def _load():
+    try:
+        with open(GAZETTEER_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        logger.info(f"Loaded gazetteer with {len(data.get('places', {}))} places from {GAZETTEER_PATH}")
+        return data
+    except (OSError, ValueError) as e:
+        logger.warning(f"No gazetteer at {GAZETTEER_PATH} ({e}); every lookup will be geocoded")
+        return {"places": {}, "aliases": {}}
+
+_DATA = _load()
+
+def resolve_location(location):
+    """
+    Return {"lat": ..., "lng": ...} for a known city/region, or None.
+    Only the most specific comma part is used, so "Gamla Stan, Stockholm"
+    misses (and gets geocoded) instead of resolving to Stockholm's centroid.
+    """
+    places, aliases = _DATA["places"], _DATA.get("aliases", {})
+    key = _fold(location)
+    if key not in places:
+        key = _fold(location.split(",")[0])
+    entry = places.get(aliases.get(key, key))
+    if not entry:
+        return None
+    return {"lat": entry["lat"], "lng": entry["lon"]}
@@ -2,6 +2,7 @@ import googlemaps
 import os
 from dotenv import load_dotenv
 from .schemas import PlaceInfo, PlaceResponse
+from .gazetteer import resolve_location
 from loguru import logger
 
 load_dotenv()
@@ -122,11 +123,15 @@ def find_nearby_places(
     """
     logger.info(f"Searching for {category}s near {location} (radius={radius}m, max={max_results}, min_rating={min_rating})")
     
-    # Geocode the location
-    geocode = gmaps.geocode(location)
-    if not geocode:
-        raise ValueError(f"Invalid location: {location}")
-    latlng = geocode[0]["geometry"]["location"]
+    # Resolve through the dataset gazetteer first, geocode only on a miss
+    latlng = resolve_location(location)
+    if latlng:
+        logger.info(f"Resolved {location} from gazetteer")
+    else:
+        geocode = gmaps.geocode(location)
+        if not geocode:
+            raise ValueError(f"Invalid location: {location}")
+        latlng = geocode[0]["geometry"]["location"]
 
     # Search for nearby places
     # Get more results initially to have better selection after filtering